@@ -0,0 +1,147 @@
+# Lists the peripheral tests affected by a set of changed files, so that only
+# those tests need to be run.  Prints the test names used in the Makefile,
+# one per line.
+#
+# The files that make up each peripheral are found from its instance in
+# src/peripherals.v, following the modules and include files it uses.
+# Changes to the rest of the design or to the test harness affect every
+# peripheral test.  Changes to other files, for example the core tests, don't
+# affect any peripheral test.
+#
+# Usage: python affected_tests.py [--base REF] [file ...]
+# With --base, the files changed since REF are used, as well as any files
+# given.  File names are relative to the root of the repository.
+
+import argparse
+import os
+import re
+import subprocess
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TEST_DIR)
+SRC_DIR = os.path.join(ROOT_DIR, "src")
+
+# Files in test/ used by all the peripheral tests
+HARNESS_FILES = {"Makefile", "test_basic.mk", "verilator.mk", "tb.v", "tb_dump.v", "tqv.py", "test_util.py",
+                 "failed_tests.py", "harness_profile.py", "qspi_model.py", "elf.py", "pc_profile.py",
+                 "requirements.txt"}
+
+def read(path):
+    with open(path, errors="replace") as f:
+        return f.read()
+
+# The peripheral tests in the Makefile, as a dict of peripheral number to list of test names
+def makefile_tests():
+    text = read(os.path.join(TEST_DIR, "Makefile")).replace("\\\n", " ")
+    tests = {}
+    for match in re.finditer(r"^USER_PERIPHERAL_(\d+)\s*=(.*)$", text, re.M):
+        tests[int(match.group(1))] = match.group(2).split()
+    return tests
+
+# The top module of each peripheral in peripherals.v, as a dict of peripheral number to module name
+def peripheral_modules():
+    text = read(os.path.join(SRC_DIR, "peripherals.v"))
+    params = {name: int(value) for name, value in re.findall(r"localparam\s+(\w+)\s*=\s*(\d+)\s*;", text)}
+
+    modules = {}
+    instance_re = r"^[ \t]*(\w+)(?:[ \t]*#[ \t]*\((?:[^()]|\([^()]*\))*\))?[ \t]+\w+[ \t]*\((.*?)\);"
+    for match in re.finditer(instance_re, text, re.M | re.S):
+        # The peripheral number is given by where its read data goes
+        port = re.search(r"\.\w+\s*\(\s*data_from_(user|simple)_peri\[(\w+)\]", match.group(2))
+        if port is None:
+            continue
+        index = port.group(2)
+        index = params[index] if index in params else int(index)
+        if port.group(1) == "simple":
+            num = 16 + index
+        elif index >= 16:
+            num = index + 16
+        else:
+            num = index
+        modules[num] = match.group(1)
+    return modules
+
+# The Verilog source files under src, with the modules each defines and the words each uses
+def scan_sources():
+    sources = {}
+    for dirpath, dirnames, filenames in os.walk(SRC_DIR):
+        for filename in filenames:
+            if os.path.splitext(filename)[1] in (".v", ".sv", ".vh", ".svh"):
+                path = os.path.relpath(os.path.join(dirpath, filename), ROOT_DIR)
+                text = read(os.path.join(ROOT_DIR, path))
+                text = re.sub(r"//.*?$|/\*.*?\*/", "", text, flags=re.M | re.S)
+                sources[path] = {
+                    "modules": set(re.findall(r"^\s*module\s+(\w+)", text, re.M)),
+                    "words": set(re.findall(r"\w+", text)),
+                    "includes": set(re.findall(r"`include\s+\"([^\"]+)\"", text)),
+                }
+    return sources
+
+# The files used by a module: the file defining it and, recursively, the files
+# defining the modules it uses and the files it includes
+def module_files(module, sources):
+    defined_in = {}
+    for path, info in sources.items():
+        for name in info["modules"]:
+            defined_in.setdefault(name, set()).add(path)
+
+    files = set()
+    todo = list(defined_in.get(module, ()))
+    while todo:
+        path = todo.pop()
+        if path in files:
+            continue
+        files.add(path)
+        info = sources[path]
+        for name, paths in defined_in.items():
+            if name in info["words"] and name not in info["modules"]:
+                todo.extend(paths)
+        for include in info["includes"]:
+            todo.extend(p for p in sources if os.path.basename(p) == os.path.basename(include))
+    return files
+
+def affected_tests(changed_files):
+    tests = makefile_tests()
+    all_tests = [test for num in sorted(tests) for test in tests[num]]
+    sources = scan_sources()
+    files = {num: module_files(module, sources) for num, module in peripheral_modules().items()}
+
+    affected = set()
+    for path in changed_files:
+        parts = path.split("/")
+        if parts[0] == "src":
+            if parts[1] == "user_peripherals":
+                for num, peri_files in files.items():
+                    # Other files in a peripheral's directory, such as memory images, are part of it too
+                    dirs = {os.path.dirname(p) for p in peri_files} - {"src/user_peripherals"}
+                    if path in peri_files or os.path.dirname(path) in dirs:
+                        affected.update(tests.get(num, []))
+            else:
+                return all_tests
+        elif parts[0] == "test":
+            if len(parts) == 2 and parts[1] in HARNESS_FILES:
+                return all_tests
+            if len(parts) > 2 and parts[1] == "user_peripherals":
+                name = os.path.splitext(parts[2])[0]
+                if name == "__init__":
+                    return all_tests
+                affected.update(test for test in all_tests if test == name or test.startswith(name + "."))
+
+    return [test for test in all_tests if test in affected]
+
+def changed_since(base):
+    output = subprocess.run(["git", "diff", "--name-only", base], cwd=ROOT_DIR, check=True,
+                            capture_output=True, text=True).stdout
+    return output.split()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List the peripheral tests affected by changed files")
+    parser.add_argument("--base", help="Include the files changed since this git ref")
+    parser.add_argument("files", nargs="*", help="Changed files, relative to the repository root")
+    args = parser.parse_args()
+
+    changed_files = list(args.files)
+    if args.base:
+        changed_files += changed_since(args.base)
+    for test in affected_tests(changed_files):
+        print(test)
@@ -0,0 +1,149 @@
+# Simulation performance benchmark
+#
+# Runs a fixed set of test suites and records, for each suite, the wall time,
+# the simulated time, the simulated ns per wall clock second and the number of
+# callbacks from the simulator into cocotb.  The results are appended to a JSON
+# history file, and compared with the previous entry in the history: a suite
+# whose simulation rate dropped by more than the threshold is reported as a
+# regression and the script exits with an error.
+#
+# Usage: python benchmark.py [--history FILE] [--threshold PERCENT] [--suite NAME ...]
+
+import argparse
+import datetime
+import json
+import os
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join("sim_build", "bench")
+
+# Name of each suite and the make arguments to run it
+SUITES = {
+    "core": ["-f", "test_basic.mk", "MODULE=test"],
+    "hello": ["-f", "test_prog.mk", "PROG=hello"],
+    "prime": ["-f", "test_prog.mk", "PROG=prime"],
+    "throughput": ["-f", "test_prog.mk", "PROG=throughput"],
+    "vgaconsole": ["-f", "test_basic.mk", "SIM_CACHE=1", "MODULE=user_peripherals.vgaconsole.test"],
+    "pulse_transmitter": ["-f", "test_basic.mk", "SIM_CACHE=1", "MODULE=user_peripherals.pulse_transmitter.test"],
+    "cordic": ["-f", "test_basic.mk", "SIM_CACHE=1", "MODULE=user_peripherals.CORDIC.test_circular_rotating_sweep_and_vis"],
+}
+
+def run_suite(name, make_args, sim):
+    results_file = os.path.join(BENCH_DIR, f"{name}.xml")
+    callback_file = os.path.join(BENCH_DIR, f"{name}.callbacks")
+    for path in (results_file, callback_file):
+        if os.path.exists(path):
+            os.remove(path)
+
+    env = dict(os.environ, TQV_CALLBACK_FILE=callback_file)
+    args = ["make", *make_args, f"SIM={sim}", "WAVES=0", f"COCOTB_RESULTS_FILE={results_file}"]
+
+    # Build first, so that compile time isn't counted.  The core and program
+    # tests share a build directory, so it is cleaned first.
+    if "SIM_CACHE=1" in make_args:
+        build_target = "sim_cache"
+    else:
+        build_target = "sim_build/rtl/" + ("Vtop" if sim == "verilator" else "sim.vvp")
+        subprocess.run(args + ["clean"], cwd=TEST_DIR, env=env, stdout=subprocess.DEVNULL)
+    subprocess.run(args + [build_target], cwd=TEST_DIR, env=env, stdout=subprocess.DEVNULL)
+
+    start = time.monotonic()
+    subprocess.run(args, cwd=TEST_DIR, env=env, stdout=subprocess.DEVNULL)
+    run_wall_s = time.monotonic() - start
+
+    result = {"run_wall_s": round(run_wall_s, 3), "passed": False}
+    try:
+        root = ET.parse(os.path.join(TEST_DIR, results_file)).getroot()
+    except (OSError, ET.ParseError):
+        return result
+
+    testcases = list(root.iter("testcase"))
+    wall_s = sum(float(tc.get("time", 0)) for tc in testcases)
+    sim_ns = sum(float(tc.get("sim_time_ns", 0)) for tc in testcases)
+    result.update({
+        "passed": len(testcases) != 0 and all(tc.find("failure") is None and tc.find("error") is None for tc in testcases),
+        "tests": len(testcases),
+        "wall_s": round(wall_s, 3),
+        "sim_ns": round(sim_ns),
+        "sim_ns_per_wall_s": round(sim_ns / wall_s) if wall_s else None,
+    })
+    try:
+        with open(os.path.join(TEST_DIR, callback_file)) as f:
+            result["callbacks"] = int(f.read())
+    except (OSError, ValueError):
+        result["callbacks"] = None
+    return result
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=TEST_DIR, check=True,
+                              capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Compare with the previous run, returning a list of regression messages
+def find_regressions(results, previous, threshold):
+    regressions = []
+    for name, result in results.items():
+        prev = previous.get(name)
+        if prev is None or not prev.get("sim_ns_per_wall_s") or not result.get("sim_ns_per_wall_s"):
+            continue
+        change = 100.0 * (result["sim_ns_per_wall_s"] / prev["sim_ns_per_wall_s"] - 1)
+        if change < -threshold:
+            regressions.append(f"{name}: simulation rate dropped {-change:.1f}% "
+                               f"({prev['sim_ns_per_wall_s']} -> {result['sim_ns_per_wall_s']} sim ns/s)")
+        if prev.get("callbacks") and result.get("callbacks"):
+            change = 100.0 * (result["callbacks"] / prev["callbacks"] - 1)
+            if change > threshold:
+                regressions.append(f"{name}: callbacks increased {change:.1f}% "
+                                   f"({prev['callbacks']} -> {result['callbacks']})")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the simulation speed of the tests")
+    parser.add_argument("--history", default="benchmark_history.json", help="JSON history file")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="Percentage slowdown from the previous run that counts as a regression")
+    parser.add_argument("--sim", default="icarus", help="Simulator to use")
+    parser.add_argument("--suite", action="append", choices=SUITES, help="Suite to run, may be repeated (default all)")
+    args = parser.parse_args()
+
+    os.makedirs(os.path.join(TEST_DIR, BENCH_DIR), exist_ok=True)
+    results = {}
+    for name in args.suite or SUITES:
+        print(f"Running {name}...", flush=True)
+        results[name] = run_suite(name, SUITES[name], args.sim)
+        print(f"  {results[name]}", flush=True)
+
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history) as f:
+            history = json.load(f)
+    previous = {}
+    for entry in history:
+        if entry.get("sim") == args.sim:
+            previous.update(entry["results"])
+
+    history.append({
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "sim": args.sim,
+        "results": results,
+    })
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=2)
+
+    failed = [name for name, result in results.items() if not result["passed"]]
+    for name in failed:
+        print(f"FAILED: {name}")
+    regressions = find_regressions(results, previous, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+    return 1 if failed or regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
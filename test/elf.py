@@ -0,0 +1,89 @@
+# Reads the loadable segments and symbols of a 32-bit little endian ELF file,
+# for running programs in test_prog.mk without converting them to hex first.
+#
+# Run as a script, writes the flash contents of an ELF file as a $readmemh
+# file for sim_qspi.v:
+#   python elf.py hex prog.elf prog.hex
+
+import struct
+import sys
+from collections import namedtuple
+
+# The memory map of TinyQV
+FLASH_ADDR = 0x0000000
+RAM_A_ADDR = 0x1000000
+RAM_B_ADDR = 0x1800000
+RAM_END = 0x2000000
+
+PT_LOAD = 1
+SHT_SYMTAB = 2
+STT_NOTYPE, STT_OBJECT, STT_FUNC = 0, 1, 2
+STB_LOCAL = 0
+
+Symbol = namedtuple("Symbol", ["address", "size", "function"])
+
+class Elf:
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            data = f.read()
+        if data[:4] != b"\x7fELF" or data[4] != 1 or data[5] != 1:
+            raise ValueError(f"{path} is not a 32-bit little endian ELF file")
+
+        (e_type, e_machine, e_version, self.entry, e_phoff, e_shoff, e_flags, e_ehsize,
+         e_phentsize, e_phnum, e_shentsize, e_shnum, e_shstrndx) = struct.unpack_from("<HHIIIIIHHHHHH", data, 16)
+
+        # The loadable segments, as a list of (address, data), loaded at their
+        # physical address so that initialised data is loaded into the flash
+        self.segments = []
+        for i in range(e_phnum):
+            p_type, p_offset, p_vaddr, p_paddr, p_filesz, p_memsz, p_flags, p_align = \
+                struct.unpack_from("<8I", data, e_phoff + i * e_phentsize)
+            if p_type == PT_LOAD and p_filesz != 0:
+                self.segments.append((p_paddr, data[p_offset:p_offset + p_filesz]))
+
+        # The symbols, as a dict of name to Symbol.  Global symbols take
+        # precedence over local symbols of the same name.
+        self.symbols = {}
+        sections = [struct.unpack_from("<10I", data, e_shoff + i * e_shentsize) for i in range(e_shnum)]
+        for sh_name, sh_type, sh_flags, sh_addr, sh_offset, sh_size, sh_link, sh_info, sh_addralign, sh_entsize in sections:
+            if sh_type != SHT_SYMTAB:
+                continue
+            strtab_offset = sections[sh_link][4]
+            local = set()
+            for offset in range(sh_offset, sh_offset + sh_size, sh_entsize):
+                st_name, st_value, st_size, st_info, st_other, st_shndx = struct.unpack_from("<IIIBBH", data, offset)
+                if st_name == 0 or st_shndx == 0 or st_info & 0xF not in (STT_NOTYPE, STT_OBJECT, STT_FUNC):
+                    continue
+                start = strtab_offset + st_name
+                name = data[start:data.index(b"\0", start)].decode()
+                if name in self.symbols and name not in local:
+                    continue
+                self.symbols[name] = Symbol(st_value, st_size, st_info & 0xF == STT_FUNC)
+                if st_info >> 4 == STB_LOCAL:
+                    local.add(name)
+                else:
+                    local.discard(name)
+
+    # The contents of the flash
+    def flash_image(self):
+        image = bytearray()
+        for addr, data in self.segments:
+            if addr + len(data) > RAM_A_ADDR:
+                raise ValueError(f"Segment at 0x{addr:07x} is not in the flash, use QSPI_MODEL=python")
+            if len(image) < addr + len(data):
+                image.extend(bytes(addr + len(data) - len(image)))
+            image[addr:addr + len(data)] = data
+        return image
+
+def write_hex(image, path):
+    with open(path, "w") as f:
+        for i in range(0, len(image), 16):
+            f.write(" ".join(f"{b:02x}" for b in image[i:i + 16]) + "\n")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "hex":
+        sys.exit("Usage: python elf.py hex prog.elf prog.hex")
+    try:
+        write_hex(Elf(sys.argv[2]).flash_image(), sys.argv[3])
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
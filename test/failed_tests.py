@@ -0,0 +1,29 @@
+# Lists the failed tests in a cocotb results file, for running them again
+# with waves.  Prints the name of each failed test, the time in ns to start
+# dumping waves from, so that the last window_us microseconds before the
+# failure are dumped, and the random seed of the run if it was recorded.  The
+# time assumes the test is run on its own.  cocotb seeds the random module for
+# each test from the run's seed and the test's name, so rerunning the test on
+# its own with RANDOM_SEED set to the seed repeats its random values.
+#
+# Usage: python failed_tests.py results.xml window_us
+
+import sys
+import xml.etree.ElementTree as ET
+
+def main(results_file, window_us):
+    try:
+        root = ET.parse(results_file).getroot()
+    except (OSError, ET.ParseError):
+        return
+
+    seed = next((prop.get("value") for prop in root.iter("property") if prop.get("name") == "random_seed"), None)
+    for testcase in root.iter("testcase"):
+        if testcase.find("failure") is None and testcase.find("error") is None:
+            continue
+        sim_time_ns = float(testcase.get("sim_time_ns", 0))
+        start_ns = max(0, int(sim_time_ns - window_us * 1000))
+        print(testcase.get("name"), start_ns, *([seed] if seed is not None else []))
+
+if __name__ == "__main__":
+    main(sys.argv[1], float(sys.argv[2]))
@@ -0,0 +1,123 @@
+# Profiling of the test harness
+#
+# If the TQV_PROFILE environment variable is set, the coroutines of test_util
+# and the TinyQV class are wrapped so that, for each test, the number of calls
+# to each of them, the Python time spent running them and the simulated time
+# they took are recorded.  When the simulation ends a table per test is written
+# to $TQV_PROFILE.txt, and the Python time by call stack is written to
+# $TQV_PROFILE.folded, which can be turned into a flame graph with
+# flamegraph.pl or loaded into speedscope.
+#
+# Python time only counts the time the coroutine (including the coroutines it
+# awaits) is actually running, not the time it is waiting on a trigger, while
+# the simulated time is from the call until it returns.  The simulated time is
+# reported in microseconds rather than clock cycles, as the tests run the clock
+# at different periods.
+
+import atexit
+import inspect
+import os
+import time
+from functools import wraps
+
+import cocotb
+from cocotb.utils import get_sim_time
+
+# Per test, a dict of function name to [calls, python seconds, simulated ns]
+stats = {}
+
+# Folded call stacks, as a dict of stack to python seconds not spent in a profiled callee
+folded = {}
+
+# The profiled calls currently running, innermost last
+stack = []
+
+def current_test():
+    manager = cocotb.regression_manager
+    if manager is None or manager._test is None:
+        return "(no test)"
+    return manager._test.__qualname__
+
+class ProfiledCall:
+    def __init__(self, name, coro):
+        self.name = name
+        self.coro = coro
+        self.child_time = 0
+
+    def finish(self, entry, start_ns):
+        entry[0] += 1
+        entry[2] += get_sim_time("ns") - start_ns
+
+    def __await__(self):
+        test = current_test()
+        entry = stats.setdefault(test, {}).setdefault(self.name, [0, 0.0, 0.0])
+        path = ";".join([test] + [call.name for call in stack] + [self.name])
+        start_ns = get_sim_time("ns")
+        value = None
+        exc = None
+        while True:
+            stack.append(self)
+            self.child_time = 0
+            start = time.perf_counter()
+            try:
+                if exc is None:
+                    trigger = self.coro.send(value)
+                else:
+                    trigger = self.coro.throw(exc)
+            except StopIteration as e:
+                self.finish(entry, start_ns)
+                return e.value
+            except BaseException:
+                self.finish(entry, start_ns)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                stack.pop()
+                entry[1] += elapsed
+                folded[path] = folded.get(path, 0.0) + elapsed - self.child_time
+                if stack:
+                    stack[-1].child_time += elapsed
+
+            try:
+                value = yield trigger
+                exc = None
+            except BaseException as e:
+                exc = e
+
+def profiled(name, func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        return await ProfiledCall(name, func(*args, **kwargs))
+    return wrapper
+
+# Wrap the named coroutine functions in a module's globals
+def profile_functions(namespace, names):
+    for name in names:
+        namespace[name] = profiled(name, namespace[name])
+
+# Wrap all the coroutine methods of a class
+def profile_class(cls):
+    for name, func in list(vars(cls).items()):
+        if inspect.iscoroutinefunction(func):
+            setattr(cls, name, profiled(f"{cls.__name__}.{name}", func))
+
+def write_report(prefix):
+    with open(prefix + ".txt", "w") as f:
+        for test, funcs in stats.items():
+            f.write(f"{test}\n")
+            f.write(f"  {'Function':<32} {'Calls':>8} {'Python ms':>10} {'us/call':>8} {'Sim us':>11} {'Sim ns/call':>11}\n")
+            for name, (calls, python_s, sim_ns) in sorted(funcs.items(), key=lambda item: -item[1][1]):
+                per_call = 1e6 * python_s / calls if calls else 0
+                sim_ns_per_call = sim_ns / calls if calls else 0
+                f.write(f"  {name:<32} {calls:>8} {1e3 * python_s:>10.1f} {per_call:>8.1f} {sim_ns / 1000:>11.1f} {sim_ns_per_call:>11.0f}\n")
+            f.write("\n")
+    with open(prefix + ".folded", "w") as f:
+        for path, python_s in folded.items():
+            # Flame graph tools need integer values, so use microseconds
+            if python_s >= 1e-6:
+                f.write(f"{path} {round(1e6 * python_s)}\n")
+
+enabled = bool(os.environ.get("TQV_PROFILE"))
+
+if enabled:
+    atexit.register(write_report, os.environ["TQV_PROFILE"])
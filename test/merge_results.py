@@ -0,0 +1,98 @@
+# Merges cocotb results files into a single JUnit results file.
+#
+# Each results file becomes a test suite, named after the file, with the
+# number of tests, failures, errors and skipped tests, and the total wall time
+# and simulated time of its tests.  The test cases keep the wall time (time)
+# and simulated time (sim_time_ns) recorded by cocotb.  A results file that is
+# missing or can't be parsed means the simulation crashed, and is reported as a
+# failed test case so that it isn't lost.
+#
+# A summary of the slowest test cases is printed, to show where the time goes.
+#
+# Usage: python merge_results.py [-o results.xml] [--slowest N] file ...
+
+import argparse
+import os
+import xml.etree.ElementTree as ET
+
+# Name of the test suite for a results file, e.g. peri-uart.xml is uart and
+# basic-results.xml is basic
+def suite_name(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    if name.startswith("peri-"):
+        name = name[len("peri-"):]
+    if name.endswith("-results"):
+        name = name[:-len("-results")]
+    return name
+
+def crashed_testcase(name, path):
+    testcase = ET.Element("testcase", name="crashed", classname=name, time="0", sim_time_ns="0")
+    ET.SubElement(testcase, "failure", message=f"{name} crashed, {path} is missing or invalid")
+    return testcase
+
+def read_suite(path):
+    name = suite_name(path)
+    suite = ET.Element("testsuite", name=name)
+    properties = ET.SubElement(suite, "properties")
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        suite.remove(properties)
+        suite.append(crashed_testcase(name, path))
+        return suite
+
+    for element in root.iter():
+        if element.tag == "property":
+            properties.append(element)
+        elif element.tag == "testcase":
+            suite.append(element)
+    if len(properties) == 0:
+        suite.remove(properties)
+    if suite.find("testcase") is None:
+        suite.append(crashed_testcase(name, path))
+    return suite
+
+def count(suites_or_cases, tag):
+    return sum(1 for element in suites_or_cases if element.find(tag) is not None)
+
+def summarise(element, testcases):
+    element.set("tests", str(len(testcases)))
+    element.set("failures", str(count(testcases, "failure")))
+    element.set("errors", str(count(testcases, "error")))
+    element.set("skipped", str(count(testcases, "skipped")))
+    element.set("time", f"{sum(float(tc.get('time', 0)) for tc in testcases):.3f}")
+    element.set("sim_time_ns", f"{sum(float(tc.get('sim_time_ns', 0)) for tc in testcases):.3f}")
+
+def merge(paths):
+    root = ET.Element("testsuites", name="results")
+    for path in paths:
+        suite = read_suite(path)
+        summarise(suite, suite.findall("testcase"))
+        root.append(suite)
+    summarise(root, root.findall("testsuite/testcase"))
+    return root
+
+def print_slowest(root, num):
+    testcases = [(suite.get("name"), tc) for suite in root for tc in suite.findall("testcase")]
+    testcases.sort(key=lambda item: -float(item[1].get("time", 0)))
+    if not testcases or num == 0:
+        return
+    print(f"Slowest tests, of {len(testcases)} taking {float(root.get('time')):.1f}s:")
+    print(f"  {'Wall s':>8} {'Sim us':>10} {'Sim ns/s':>10}  Test")
+    for name, tc in testcases[:num]:
+        time = float(tc.get("time", 0))
+        sim_ns = float(tc.get("sim_time_ns", 0))
+        rate = f"{sim_ns / time:10.0f}" if time else f"{'-':>10}"
+        print(f"  {time:8.2f} {sim_ns / 1000:10.1f} {rate}  {name}.{tc.get('name')}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge cocotb results files")
+    parser.add_argument("files", nargs="*", help="Results files to merge")
+    parser.add_argument("-o", "--output", default="results.xml", help="Merged results file")
+    parser.add_argument("--slowest", type=int, default=10, help="Number of slowest tests to list")
+    args = parser.parse_args()
+
+    root = merge(args.files)
+    ET.indent(root)
+    ET.ElementTree(root).write(args.output, encoding="UTF-8", xml_declaration=True)
+    print_slowest(root, args.slowest)
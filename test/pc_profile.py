@@ -0,0 +1,100 @@
+# Profiling of the program run by test_prog.mk, by sampling the address TinyQV
+# is fetching instructions from.
+#
+# If the PC_PROFILE environment variable is set, the fetch address is sampled
+# about every PC_PROFILE_CYCLES clock cycles (default 100), or on every change
+# of the fetch address if PC_PROFILE_CYCLES is 0.  The interval is varied
+# randomly by up to half either way, so that loops that take a multiple of
+# the interval are not always sampled at the same point.
+#
+# When the simulation ends, the number of samples in each function, and the
+# most sampled addresses, are written to $PC_PROFILE.txt, and the samples per
+# function to $PC_PROFILE.folded for flamegraph.pl or speedscope.  Functions
+# are found from the symbols of the program when it is an ELF file, or of the
+# ELF file given by PC_PROFILE_ELF.  Addresses outside any function are
+# counted by address.
+
+import atexit
+import bisect
+import os
+import random
+from collections import Counter
+
+import cocotb
+from cocotb.triggers import Edge, Timer
+
+import elf
+
+# Clock period used by the program tests
+CLOCK_PERIOD_NS = 15.624
+
+class PcProfiler:
+    def __init__(self, interval_cycles, elf_file=None):
+        self.interval_cycles = interval_cycles
+        self.samples = Counter()
+        self.task = None
+        # A separate generator, so that the tests' random numbers are unaffected
+        self.random = random.Random(0)
+
+        self.functions = []
+        if elf_file:
+            self.functions = sorted((symbol.address, symbol.address + symbol.size, name)
+                                    for name, symbol in elf.Elf(elf_file).symbols.items()
+                                    if symbol.function and symbol.size != 0)
+        self.starts = [start for start, end, name in self.functions]
+
+    def start(self, dut):
+        if self.task is None or self.task.done():
+            self.task = cocotb.start_soon(self.run(dut))
+
+    async def run(self, dut):
+        instr_addr = dut.user_project.i_tinyqv.instr_addr
+        while True:
+            if self.interval_cycles == 0:
+                await Edge(instr_addr)
+            else:
+                cycles = self.random.randint(self.interval_cycles // 2 + 1, self.interval_cycles * 3 // 2)
+                await Timer(cycles * CLOCK_PERIOD_NS, "ns", round_mode="round")
+            value = instr_addr.value
+            if value.is_resolvable:
+                self.samples[value.integer * 2] += 1
+
+    def function(self, addr):
+        i = bisect.bisect_right(self.starts, addr) - 1
+        if i >= 0 and addr < self.functions[i][1]:
+            return self.functions[i][2], addr - self.functions[i][0]
+        return None, 0
+
+    def location(self, addr):
+        name, offset = self.function(addr)
+        return f"{name}+0x{offset:x}" if name else f"0x{addr:07x}"
+
+    def write_report(self, prefix):
+        total = sum(self.samples.values())
+        by_function = Counter()
+        for addr, count in self.samples.items():
+            name, offset = self.function(addr)
+            by_function[name or f"0x{addr:07x}"] += count
+
+        with open(prefix + ".txt", "w") as f:
+            f.write(f"{total} samples\n\n")
+            f.write(f"{'Samples':>8} {'%':>6}  Function\n")
+            for name, count in by_function.most_common():
+                f.write(f"{count:>8} {100 * count / total:>6.2f}  {name}\n")
+            f.write(f"\n{'Samples':>8} {'%':>6}  Address\n")
+            for addr, count in self.samples.most_common(50):
+                f.write(f"{count:>8} {100 * count / total:>6.2f}  0x{addr:07x} {self.location(addr)}\n")
+        with open(prefix + ".folded", "w") as f:
+            for name, count in by_function.most_common():
+                f.write(f"{name} {count}\n")
+
+profiler = None
+
+# Start profiling the design, if enabled
+def start(dut):
+    global profiler
+    if profiler is None:
+        profiler = PcProfiler(int(os.environ.get("PC_PROFILE_CYCLES", 100)),
+                              os.environ.get("PC_PROFILE_ELF") or os.environ.get("PROG_ELF"))
+        atexit.register(profiler.write_report, os.environ["PC_PROFILE"])
+    profiler.start(dut)
@@ -0,0 +1,218 @@
+# Python model of the QSPI PMOD flash and RAMs, an alternative to sim_qspi.v
+# selected with QSPI_MODEL=python in test_prog.mk.
+#
+# It follows the protocol of sim_qspi.v: the flash is read in continuous read
+# mode (6 address nibbles, 2 mode nibbles and 4 dummy nibbles), and the RAMs
+# take a command (0x0B read with 4 dummy nibbles or 0x02 write) and 6 address
+# nibbles.  The memories are held in bytearrays, or memory mapped files, of
+# any size up to the 16MB flash and 8MB RAM address spaces, so programs are
+# not limited to the 32KB ROM of sim_qspi.v.
+#
+# The environment variables used are:
+#   PROG_FILE          .hex ($readmemh format) or .bin file loaded into the flash,
+#                      or .elf file whose segments are loaded into the flash and RAMs
+#   QSPI_FLASH_SIZE    Flash size in bytes, default 16MB
+#   QSPI_RAM_SIZE      Size of each RAM in bytes, default 8MB
+#   QSPI_MEMORY_DIR    If set, the memories are memory mapped files in this directory
+#   QSPI_DUMP          If set, the memories are written to $QSPI_DUMP-<memory>.bin
+#                      and the access statistics to $QSPI_DUMP-stats.json when the
+#                      simulation ends
+
+import atexit
+import json
+import mmap
+import os
+
+import cocotb
+from cocotb.triggers import Edge
+
+import elf
+
+FLASH_SIZE = int(os.environ.get("QSPI_FLASH_SIZE", 16 << 20))
+RAM_SIZE = int(os.environ.get("QSPI_RAM_SIZE", 8 << 20))
+
+class Memory:
+    def __init__(self, name, size, directory=None):
+        self.name = name
+        self.size = size
+        if directory is None:
+            self.data = bytearray(size)
+        else:
+            with open(os.path.join(directory, f"{name}.bin"), "w+b") as f:
+                f.truncate(size)
+                self.data = mmap.mmap(f.fileno(), size)
+
+        # Access statistics
+        self.reads = 0
+        self.writes = 0
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    # Copy data into the memory at addr, failing if it doesn't fit
+    def store(self, addr, data):
+        assert addr + len(data) <= self.size, f"0x{len(data):x} bytes at 0x{addr:06x} don't fit in the {self.name}"
+        self.data[addr:addr + len(data)] = data
+
+    # Load a file in $readmemh format, with whitespace separated hex bytes,
+    # optional @address words and // comments
+    def load_hex(self, path, offset=0):
+        with open(path) as f:
+            words = " ".join(line.split("//", 1)[0] for line in f).split()
+        addr = offset
+        start = 0
+        for i in range(len(words) + 1):
+            if i == len(words) or words[i].startswith("@"):
+                data = bytes.fromhex("".join(word.zfill(2) for word in words[start:i]))
+                self.store(addr, data)
+                if i != len(words):
+                    addr = offset + int(words[i][1:], 16)
+                    start = i + 1
+
+    def load_bin(self, path, offset=0):
+        with open(path, "rb") as f:
+            data = f.read()
+        self.store(offset, data)
+
+    def load(self, path, offset=0):
+        if path.endswith(".bin"):
+            self.load_bin(path, offset)
+        else:
+            self.load_hex(path, offset)
+
+    def dump(self, path):
+        with open(path, "wb") as f:
+            f.write(self.data)
+
+    def stats(self):
+        return {"reads": self.reads, "writes": self.writes,
+                "bytes_read": self.bytes_read, "bytes_written": self.bytes_written}
+
+class QspiModel:
+    def __init__(self, dut, flash_size=FLASH_SIZE, ram_size=RAM_SIZE, directory=None):
+        self.dut = dut
+        self.flash = Memory("flash", flash_size, directory)
+        self.ram_a = Memory("ram_a", ram_size, directory)
+        self.ram_b = Memory("ram_b", ram_size, directory)
+        self.task = None
+
+    # Load a program file, ELF segments are loaded into the memory at their address
+    def load(self, path):
+        if not path.endswith(".elf"):
+            self.flash.load(path)
+            return
+        for addr, data in elf.Elf(path).segments:
+            if addr < elf.RAM_A_ADDR:
+                memory, offset = self.flash, addr - elf.FLASH_ADDR
+            elif addr < elf.RAM_B_ADDR:
+                memory, offset = self.ram_a, addr - elf.RAM_A_ADDR
+            else:
+                memory, offset = self.ram_b, addr - elf.RAM_B_ADDR
+            memory.store(offset, data)
+
+    def start(self, dut):
+        self.dut = dut
+        if self.task is None or self.task.done():
+            self.task = cocotb.start_soon(self.run())
+
+    def selected(self):
+        if self.dut.qspi_flash_select.value == 0:
+            return self.flash
+        elif self.dut.qspi_ram_a_select.value == 0:
+            return self.ram_a
+        elif self.dut.qspi_ram_b_select.value == 0:
+            return self.ram_b
+        return None
+
+    async def run(self):
+        dut = self.dut
+        qspi_clk = dut.qspi_clk_out
+        data_out = dut.buffered_qspi_data_reg
+        deselect_count = None
+        memory = None
+        last_out = 0
+
+        while True:
+            await Edge(qspi_clk)
+
+            # sim_qspi.v resets when no memory is selected, which the testbench
+            # counts so that back to back transactions are seen here.
+            if dut.qspi_deselect_count.value.integer != deselect_count:
+                deselect_count = dut.qspi_deselect_count.value.integer
+                last_out = 0
+                memory = self.selected()
+                start_count = 0
+                cmd = 0
+                addr = 0
+                reading_dummy = reading = writing = error = False
+            if memory is None:
+                continue
+
+            if qspi_clk.value == 1:
+                start_count += 1
+                data_in = dut.qspi_data_out.value.integer & dut.qspi_data_oe.value.integer
+                if writing:
+                    index = (addr >> 1) % memory.size
+                    if addr & 1:
+                        memory.data[index] = (memory.data[index] & 0xF0) | data_in
+                        memory.bytes_written += 1
+                    else:
+                        memory.data[index] = (memory.data[index] & 0x0F) | (data_in << 4)
+                elif not (reading or error):
+                    cmd = ((cmd << 4) | data_in) & 0xFFFFFFFF
+                continue
+
+            if reading or writing:
+                addr += 1
+            elif reading_dummy:
+                if start_count < 8 and cmd & 0xF != 0b1010:
+                    error = True
+                    reading_dummy = False
+                if start_count == 12:
+                    reading = True
+                    reading_dummy = False
+                    memory.reads += 1
+            elif not error and start_count == (6 if memory is self.flash else 8):
+                addr = (cmd & 0xFFFFFF) << 1
+                if memory is self.flash or cmd >> 24 == 0x0B:
+                    reading_dummy = True
+                elif cmd >> 24 == 0x02:
+                    writing = True
+                    memory.writes += 1
+                else:
+                    error = True
+
+            if reading:
+                value = memory.data[(addr >> 1) % memory.size]
+                if addr & 1:
+                    value &= 0xF
+                    memory.bytes_read += 1
+                else:
+                    value >>= 4
+            else:
+                value = 0
+            if value != last_out:
+                data_out.value = value
+                last_out = value
+
+    def dump(self, prefix):
+        for memory in (self.flash, self.ram_a, self.ram_b):
+            memory.dump(f"{prefix}-{memory.name}.bin")
+        with open(f"{prefix}-stats.json", "w") as f:
+            json.dump(self.stats(), f, indent=2)
+
+    def stats(self):
+        return {memory.name: memory.stats() for memory in (self.flash, self.ram_a, self.ram_b)}
+
+model = None
+
+# Start the model for the design, creating it and loading PROG_FILE the first time
+def start(dut):
+    global model
+    assert hasattr(dut, "qspi_deselect_count"), "The simulation was built without QSPI_MODEL=python, run make clean"
+    if model is None:
+        model = QspiModel(dut, directory=os.environ.get("QSPI_MEMORY_DIR"))
+        if os.environ.get("PROG_FILE"):
+            model.load(os.environ["PROG_FILE"])
+        if os.environ.get("QSPI_DUMP"):
+            atexit.register(model.dump, os.environ["QSPI_DUMP"])
+    model.start(dut)
@@ -0,0 +1,104 @@
+# Splits the core tests in test.py and the peripheral tests into shards, so
+# that they can be run across several machines, see "make shard" in the
+# Makefile.
+#
+# The tests are assigned to shards by their run time in test_times.json, largest
+# first, each going to the shard with the least total time so far, so that the
+# shards take about the same time.  Tests not in test_times.json are taken to
+# have the median time.  Update test_times.json from the results of a full run
+# with --record.
+#
+# Usage:
+#   python shard.py I/N core        The core tests in shard I of N, comma separated
+#   python shard.py I/N peri        The peripheral tests in shard I of N
+#   python shard.py --seed BASE JOB The random seed for a job, derived from BASE
+#   python shard.py --record FILE...  Update test_times.json from results files
+# Shards are numbered from 1 to N.
+
+import argparse
+import json
+import os
+import re
+import statistics
+import xml.etree.ElementTree as ET
+import zlib
+
+from affected_tests import makefile_tests
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+TIMES_FILE = os.path.join(TEST_DIR, "test_times.json")
+
+# The tests as a list of jobs, "core:<test function>" and "peri:<peripheral test>"
+def all_jobs():
+    with open(os.path.join(TEST_DIR, "test.py")) as f:
+        core = re.findall(r"^@cocotb\.test\(\)\s*\nasync def (\w+)", f.read(), re.M)
+    tests = makefile_tests()
+    peri = [test for num in sorted(tests) for test in tests[num]]
+    return [f"core:{test}" for test in core] + [f"peri:{test}" for test in peri]
+
+def load_times():
+    if not os.path.exists(TIMES_FILE):
+        return {}
+    with open(TIMES_FILE) as f:
+        return json.load(f)
+
+def assign_shards(jobs, times, num_shards):
+    default = statistics.median(times.values()) if times else 1.0
+    shards = [[] for _ in range(num_shards)]
+    totals = [0.0] * num_shards
+    for job in sorted(jobs, key=lambda job: (-times.get(job, default), job)):
+        i = totals.index(min(totals))
+        shards[i].append(job)
+        totals[i] += times.get(job, default)
+    return shards
+
+# A seed for a job, which only depends on the base and the job, so that it
+# doesn't change when the tests are split differently
+def job_seed(base, job):
+    return zlib.crc32(f"{base}:{job}".encode())
+
+# Update the test times with the tests in cocotb results files.  The core
+# tests are recorded individually, the peripheral tests by module.
+def record(results_files):
+    times = load_times()
+    run_times = {}
+    for path in results_files:
+        for testcase in ET.parse(path).getroot().iter("testcase"):
+            module = testcase.get("classname", "")
+            if module == "test":
+                job = f"core:{testcase.get('name')}"
+            elif module.startswith("user_peripherals."):
+                job = f"peri:{module[len('user_peripherals.'):]}"
+            else:
+                continue
+            run_times[job] = run_times.get(job, 0.0) + float(testcase.get("time", 0))
+    times.update({job: round(time, 1) for job, time in run_times.items()})
+    with open(TIMES_FILE, "w") as f:
+        json.dump(dict(sorted(times.items())), f, indent=2)
+        f.write("\n")
+
+def parse_shard(spec):
+    match = re.fullmatch(r"(\d+)/(\d+)", spec)
+    if match is None or not 1 <= int(match.group(1)) <= int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"shard should be I/N with 1 <= I <= N, not {spec}")
+    return int(match.group(1)), int(match.group(2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split the tests into shards")
+    parser.add_argument("shard", nargs="?", type=parse_shard, help="Shard as I/N")
+    parser.add_argument("kind", nargs="?", choices=("core", "peri"), help="Kind of tests to list")
+    parser.add_argument("--seed", nargs=2, metavar=("BASE", "JOB"), help="Print the random seed for a job")
+    parser.add_argument("--record", nargs="+", metavar="FILE", help="Update test_times.json from results files")
+    args = parser.parse_args()
+
+    if args.seed:
+        print(job_seed(*args.seed))
+    elif args.record:
+        record(args.record)
+    elif args.shard and args.kind:
+        index, num_shards = args.shard
+        jobs = assign_shards(all_jobs(), load_times(), num_shards)[index - 1]
+        tests = [job.split(":", 1)[1] for job in jobs if job.startswith(args.kind + ":")]
+        print(("," if args.kind == "core" else " ").join(tests))
+    else:
+        parser.error("give a shard and kind, --seed or --record")
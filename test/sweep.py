@@ -0,0 +1,133 @@
+# Runs programs across the QSPI latency settings and reports, in one table,
+# how many cycles each takes and how well it uses the QSPI bus, see
+# test_sweep.py for what is measured.
+#
+# Each program is given as [NAME=]FILE, so that builds of the same program
+# with its data placed differently, for example read from the flash or kept
+# in RAM A or RAM B, can be compared.  TinyQV only executes code from the
+# flash, so an ELF program whose entry point or functions are outside the
+# flash is rejected.  The programs are run with the Python QSPI model, which
+# loads ELF data segments into the RAMs.  Each runs until it reaches --end,
+# prints --end-text or has run for --cycles cycles.
+#
+# The table is printed, and written to the output file as JSON and with a
+# .csv extension as CSV.
+#
+# Usage: python sweep.py [--latency N,...] [--end SYMBOL | --end-text TEXT | --cycles N] [NAME=]FILE ...
+# For example:
+#   python sweep.py --end-text "Hello 36" flash=hello.hex
+#   python sweep.py --end main_end flash_data=prog.elf ram_data=prog_ram.elf
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import elf
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SWEEP_DIR = os.path.join("sim_build", "sweep")
+
+COLUMNS = ["prog", "latency", "cycles", "instrs", "ipc", "qspi_busy", "qspi_stall",
+           "flash_txns", "ram_txns", "data_bytes", "fetch_eff"]
+
+def parse_prog(spec):
+    name, sep, path = spec.partition("=")
+    if not sep:
+        name, path = os.path.splitext(os.path.basename(spec))[0], spec
+    return name, path
+
+# Check the program's code is in the flash, the only memory TinyQV executes from
+def check_prog(path):
+    if not path.endswith(".elf"):
+        return
+    prog = elf.Elf(path)
+    if prog.entry >= elf.RAM_A_ADDR:
+        sys.exit(f"{path} starts at 0x{prog.entry:07x}, but code can only run from the flash")
+    for name, symbol in prog.symbols.items():
+        if symbol.function and symbol.address >= elf.RAM_A_ADDR:
+            sys.exit(f"{path} has function {name} at 0x{symbol.address:07x}, but code can only run from the flash")
+
+def run_prog(name, path, args):
+    report_file = os.path.join(SWEEP_DIR, f"{name}.json")
+    if os.path.exists(os.path.join(TEST_DIR, report_file)):
+        os.remove(os.path.join(TEST_DIR, report_file))
+
+    env = dict(os.environ, SWEEP_REPORT=report_file, SWEEP_LATENCIES=args.latency,
+               SWEEP_CYCLES=str(args.cycles))
+    if args.end:
+        env["SWEEP_END"] = args.end
+    if args.end_text:
+        env["SWEEP_END_TEXT"] = args.end_text
+    subprocess.run(["make", "-f", "test_prog.mk", f"SIM={args.sim}", "WAVES=0", "QSPI_MODEL=python",
+                    f"PROG_FILE={os.path.abspath(path)}", "MODULE=test_sweep",
+                    f"COCOTB_RESULTS_FILE={os.path.join(SWEEP_DIR, name + '.xml')}"],
+                   cwd=TEST_DIR, env=env, stdout=subprocess.DEVNULL)
+
+    try:
+        with open(os.path.join(TEST_DIR, report_file)) as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return None
+    rows = []
+    for latency, result in report.items():
+        transactions = result.pop("transactions")
+        rows.append(dict(prog=name, latency=int(latency), flash_txns=transactions["flash"],
+                         ram_txns=transactions["ram_a"] + transactions["ram_b"], **result))
+    return rows
+
+def print_table(rows):
+    widths = [max(len(column), *(len(str(row[column])) for row in rows)) for column in COLUMNS]
+    print("  ".join(column.rjust(width) for column, width in zip(COLUMNS, widths)))
+    for row in rows:
+        print("  ".join(str(row[column]).rjust(width) for column, width in zip(COLUMNS, widths)))
+
+def write_report(rows, path):
+    with open(path, "w") as f:
+        json.dump(rows, f, indent=2)
+    with open(os.path.splitext(path)[0] + ".csv", "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure programs across the QSPI latency settings")
+    parser.add_argument("progs", nargs="+", metavar="[NAME=]FILE", help="Program files to run")
+    parser.add_argument("--latency", default="1,2,3", help="Comma separated latency settings to run at")
+    end = parser.add_mutually_exclusive_group()
+    end.add_argument("--end", help="Symbol or address at which the program has finished")
+    end.add_argument("--end-text", help="UART output after which the program has finished")
+    parser.add_argument("--cycles", type=int, default=100000,
+                        help="Cycles to run each program for, if neither --end nor --end-text is given")
+    parser.add_argument("--sim", default="icarus", help="Simulator to use")
+    parser.add_argument("-o", "--output", default="sweep.json", help="Report file")
+    args = parser.parse_args()
+    progs = [parse_prog(spec) for spec in args.progs]
+    for name, path in progs:
+        check_prog(path)
+
+    # The program is loaded by the Python model when the simulation starts, so
+    # the design is only built once, but must be built for the Python model.
+    subprocess.run(["make", "-f", "test_prog.mk", "clean"], cwd=TEST_DIR, stdout=subprocess.DEVNULL)
+    os.makedirs(os.path.join(TEST_DIR, SWEEP_DIR), exist_ok=True)
+
+    rows = []
+    failed = []
+    for name, path in progs:
+        print(f"Running {name}...", flush=True)
+        prog_rows = run_prog(name, path, args)
+        if prog_rows is None:
+            failed.append(name)
+        else:
+            rows.extend(prog_rows)
+
+    if rows:
+        print_table(rows)
+        write_report(rows, args.output)
+    if failed:
+        sys.exit(f"Failed: {', '.join(failed)}")
+
+if __name__ == "__main__":
+    main()
@@ -18,7 +18,6 @@ module tb ();
 
   wire [3:0] qspi_data_in;
   reg [2:0] latency_cfg;
-  assign {uio_in[5:4], uio_in[2:1]} = rst_n ? qspi_data_in : {1'b0, latency_cfg};
 
   wire [3:0] qspi_data_out = {uio_out[5:4], uio_out[2:1]};
   wire [3:0] qspi_data_oe  = {uio_oe[5:4],  uio_oe[2:1]};
@@ -38,6 +37,79 @@ module tb ();
   wire game_clk = ui_in_base[5];
   wire game_data = ui_in_base[6];
 
+  // Instruction feeder.  This answers instruction fetches from a buffer of
+  // nibbles loaded by the cocotb test, so that straight line sequences of
+  // instructions don't need a Python callback on every clock.
+  // The test writes the nibbles to feed_data, first nibble in the bottom bits,
+  // and then sets feed_count to the number of nibbles.  While feed_count is
+  // non-zero the feeder drives the QSPI data in, moving on to the next nibble
+  // each time the QSPI clock falls.  feed_error is set if the flash is
+  // deselected before all the nibbles have been read.  As in drive_instr in
+  // test_util.py, the flash may be deselected once the last nibble has been
+  // read, as it is for a load or store to the RAMs.
+  //
+  // When the buffer is empty the feeder can also keep the CPU idle by
+  // answering fetches with NOPs.  The test sets feed_idle and feed_idle_busy
+  // to start sending NOPs, and clears feed_idle to stop.  feed_idle_busy is
+  // cleared when the NOP in progress completes.
+  localparam FEED_NIBBLES = 256;
+  reg [FEED_NIBBLES*4-1:0] feed_data;
+  reg [8:0] feed_count;
+  reg feed_error;
+  reg feed_qspi_clk;
+  reg feed_sampled;  // The QSPI clock has risen during the current nibble
+  wire feed_busy = feed_count != 0;
+
+  reg feed_idle;
+  reg feed_idle_busy;
+  reg [2:0] feed_idle_pos;
+  wire [3:0] feed_idle_nibble = (feed_idle_pos == 3'd0) ? 4'h1 :   // ADDI x0, x0, 0
+                                (feed_idle_pos == 3'd1) ? 4'h3 : 4'h0;
+
+  initial begin
+    feed_count = 0;
+    feed_error = 0;
+    feed_sampled = 0;
+    feed_idle = 0;
+    feed_idle_busy = 0;
+    feed_idle_pos = 0;
+  end
+
+  always @(negedge clk) begin
+    feed_qspi_clk <= qspi_clk_out;
+    if (feed_busy) begin
+      if (qspi_flash_select) begin
+        if (feed_count != 1 || !feed_sampled) feed_error <= 1;
+        feed_count <= 0;
+        feed_sampled <= 0;
+      end else if (feed_qspi_clk && !qspi_clk_out) begin
+        feed_data <= {4'h0, feed_data[FEED_NIBBLES*4-1:4]};
+        feed_count <= feed_count - 1;
+        feed_sampled <= 0;
+      end else if (!feed_qspi_clk && qspi_clk_out) begin
+        feed_sampled <= 1;
+      end
+    end else if (feed_idle_busy) begin
+      if (qspi_flash_select) begin
+        feed_error <= 1;
+        feed_idle_busy <= 0;
+        feed_idle_pos <= 0;
+      end else if (feed_qspi_clk && !qspi_clk_out) begin
+        feed_idle_pos <= feed_idle_pos + 1;
+        if (feed_idle_pos == 3'd7) feed_idle_busy <= feed_idle;
+      end
+    end
+  end
+
+  wire [3:0] qspi_data_to_core = feed_busy      ? feed_data[3:0] :
+                                 feed_idle_busy ? feed_idle_nibble :
+                                                  qspi_data_in;
+  assign {uio_in[5:4], uio_in[2:1]} = rst_n ? qspi_data_to_core : {1'b0, latency_cfg};
+
+  // Waves are only dumped while this is set, when running with WAVES=marked.
+  // See tb_dump.v and test_util.waves().
+  reg waves_on;
+
   wire uart_tx = uo_out[0];
   wire uart_rts = uo_out[1];
   wire debug_uart_tx = uo_out[6];
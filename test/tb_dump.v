@@ -0,0 +1,34 @@
+`default_nettype none `timescale 1ns / 100ps
+
+// Writes waves from tb to the file given by the +dumpfile plusarg.
+// Used instead of the cocotb dump module when the compiled simulation is
+// shared between tests, so that each test can write its own file, and to
+// only dump part of the simulation:
+//   +dumpoff       Waves are only dumped while tb.waves_on is set by the test.
+//   +dumpfrom=<n>  Waves are only dumped from n ns into the simulation.
+module tb_dump ();
+
+  reg [8*256-1:0] dumpfile;
+  reg [63:0] dump_from;
+
+  initial begin
+    dumpfile = 0;
+    tb.waves_on = !$test$plusargs("dumpoff") && !$test$plusargs("dumpfrom");
+    if ($value$plusargs("dumpfile=%s", dumpfile)) begin
+      $dumpfile(dumpfile);
+      $dumpvars(0, tb);
+      if (!tb.waves_on) $dumpoff;
+    end
+    if ($value$plusargs("dumpfrom=%d", dump_from)) begin
+      #(dump_from) tb.waves_on = 1;
+    end
+  end
+
+  always @(tb.waves_on) begin
+    if (dumpfile != 0) begin
+      if (tb.waves_on) $dumpon;
+      else $dumpoff;
+    end
+  end
+
+endmodule
@@ -73,6 +73,19 @@ module tb_qspi ();
   assign qspi_data_in = (latency_cfg < 1) ? buffered_qspi_data :
                         data_buffer[(latency_cfg - 1) * 4 +:4];
 
+`ifdef PY_QSPI
+  // The QSPI PMOD is simulated by qspi_model.py, which drives buffered_qspi_data.
+  // Deselecting all the memories ends a transaction, this is counted so that
+  // the model can see back to back transactions.
+  reg [3:0] buffered_qspi_data_reg = 0;
+  reg [7:0] qspi_deselect_count = 0;
+  wire qspi_none_selected = qspi_flash_select & qspi_ram_a_select & qspi_ram_b_select;
+  assign buffered_qspi_data = buffered_qspi_data_reg;
+  always @(posedge qspi_none_selected) begin
+    qspi_deselect_count <= qspi_deselect_count + 1;
+    buffered_qspi_data_reg <= 0;
+  end
+`else
   // Simulated QSPI PMOD
   sim_qspi_pmod qspi (
     .qspi_data_in(qspi_data_out & qspi_data_oe),
@@ -85,5 +98,6 @@ module tb_qspi ();
   );
 
   defparam qspi.INIT_FILE = `PROG_FILE;
+`endif
 
 endmodule
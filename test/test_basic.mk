@@ -60,8 +60,48 @@ endif
 VERILOG_SOURCES += $(PWD)/tb.v
 TOPLEVEL = tb
 
+# Verilator settings
+include verilator.mk
+
+# With Icarus, WAVES may also be set to "marked" to only dump waves inside
+# the regions marked by the test with test_util.waves() or dump_window(), and
+# DUMP_FROM_NS can be set to only dump waves from that time onwards.
+# These use tb_dump.v, which writes the waves to DUMP_FILE.  It is also used
+# for cached builds, so that the waves of each test can go to a different file.
+ifeq ($(SIM),icarus)
+ifeq ($(WAVES),marked)
+PLUSARGS += +dumpoff
+endif
+ifneq ($(DUMP_FROM_NS),)
+PLUSARGS += +dumpfrom=$(DUMP_FROM_NS)
+endif
+ifneq ($(filter 1,$(SIM_CACHE))$(filter marked,$(WAVES))$(DUMP_FROM_NS),)
+VERILOG_SOURCES += $(PWD)/tb_dump.v
+COMPILE_ARGS += -s tb_dump
+ifneq ($(WAVES),0)
+DUMP_FILE ?= $(SIM_BUILD)/tb.fst
+PLUSARGS += -fst +dumpfile=$(DUMP_FILE)
+endif
+override WAVES = 0
+endif
+endif
+
 # MODULE is the basename of the Python test file
 MODULE ?= test
 
+# With SIM_CACHE=1 the compiled simulation is kept in sim_build/cache, in a
+# directory named by a hash of the sources and compile arguments, so it is
+# shared by all tests and only rebuilt when the sources change.
+# Waves are written to DUMP_FILE, as the compiled simulation is shared.
+ifeq ($(SIM_CACHE),1)
+SIM_HASH := $(shell (echo $(SIM) $(COMPILE_ARGS); cat $(VERILOG_SOURCES) $$(find $(SRC_DIR) -name '*.vh' -o -name '*.svh' | sort)) 2>/dev/null | sha1sum | cut -c1-16)
+SIM_BUILD := sim_build/cache/$(SIM_HASH)
+endif
+
+
 # include cocotb's make rules to take care of the simulator setup
 include $(shell cocotb-config --makefiles)/Makefile.sim
+
+# Build the simulation without running it
+.PHONY: sim_cache
+sim_cache: $(SIM_BUILD)/$(if $(filter verilator,$(SIM)),Vtop,sim.vvp)
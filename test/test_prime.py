@@ -7,30 +7,11 @@ import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, Timer
 
-from test_util import reset
+from test_util import reset, UartMonitor
 
-async def receive_string(dut, str):
-    for char in str:
-        dut._log.info(f"Wait for: {char}")
-
-        for _ in range(20000):
-            await ClockCycles(dut.clk, 8)
-            if dut.uart_tx.value == 0:
-                break
-        else:
-            # Should have started by now
-            assert dut.uart_tx.value == 0
-        
-        uart_byte = ord(char)
-        bit_time = 8680
-        await Timer(bit_time / 2, "ns")
-        assert dut.uart_tx.value == 0
-        for i in range(8):
-            await Timer(bit_time, "ns")
-            assert dut.uart_tx.value == (uart_byte & 1)
-            uart_byte >>= 1
-        await Timer(bit_time, "ns")
-        assert dut.uart_tx.value == 1
+# Computing the primes is slow, so each character is allowed 20000 x 8
+# clocks (2.5ms) to start, plus the time to send it
+TIMEOUT_US = 2600
 
 @cocotb.test()
 async def test_prime(dut):
@@ -41,13 +22,14 @@ async def test_prime(dut):
     cocotb.start_soon(clock.start())
 
     await reset(dut, 3)
-
-    await receive_string(dut, "3 ")
-    await receive_string(dut, "5 ")
-    await receive_string(dut, "7 ")
-    await receive_string(dut, "11 ")
-    await receive_string(dut, "13 ")
-    await receive_string(dut, "17 ")
-    await receive_string(dut, "19 ")
-    await receive_string(dut, "23 ")
-    await receive_string(dut, "29 ")
+    uart = UartMonitor(dut)
+
+    await uart.expect("3 ", TIMEOUT_US)
+    await uart.expect("5 ", TIMEOUT_US)
+    await uart.expect("7 ", TIMEOUT_US)
+    await uart.expect("11 ", TIMEOUT_US)
+    await uart.expect("13 ", TIMEOUT_US)
+    await uart.expect("17 ", TIMEOUT_US)
+    await uart.expect("19 ", TIMEOUT_US)
+    await uart.expect("23 ", TIMEOUT_US)
+    await uart.expect("29 ", TIMEOUT_US)
@@ -6,13 +6,36 @@ SIM ?= icarus
 WAVES ?= 1
 TOPLEVEL_LANG ?= verilog
 PROG ?= hello
-PROG_FILE ?= $(PROG).hex
+# PROG=<name> runs <name>.elf if there is one, otherwise <name>.hex
+PROG_FILE ?= $(if $(wildcard $(PROG).elf),$(PROG).elf,$(PROG).hex)
 SRC_DIR = $(PWD)/../src
 PROJECT_SOURCES = project.v peri*.v tinyQV/cpu/*.v tinyQV/peri/uart/uart_tx.v user_peripherals/*/*.v user_peripherals/*.v user_peripherals/*.sv user_peripherals/*/*.sv
 
-VERILOG_SOURCES += sim_qspi.v
 COMPILE_ARGS +=  -DPROG_FILE=\"$(PROG_FILE)\"
 
+# QSPI_MODEL=python simulates the QSPI flash and RAMs with qspi_model.py
+# instead of sim_qspi.v, which allows programs larger than 32KB.  Run make
+# clean after changing it.
+QSPI_MODEL ?= verilog
+ifeq ($(QSPI_MODEL),python)
+COMPILE_ARGS += -DPY_QSPI
+export QSPI_MODEL
+export PROG_FILE
+else
+VERILOG_SOURCES += sim_qspi.v
+endif
+
+# PROG_FILE can also be an ELF file, whose symbols can then be used by the
+# test, see test_util.py.  For sim_qspi.v the flash contents are converted
+# to a hex file before the simulation runs, by the rule at the end.
+ifeq ($(suffix $(PROG_FILE)),.elf)
+export PROG_ELF := $(PROG_FILE)
+ifneq ($(QSPI_MODEL),python)
+override PROG_FILE := $(basename $(PROG_ELF)).flash.hex
+CUSTOM_SIM_DEPS += $(PROG_FILE)
+endif
+endif
+
 ifneq ($(GATES),yes)
 
 ifneq ($(SYNTH),yes)
@@ -64,8 +87,19 @@ endif
 VERILOG_SOURCES += $(PWD)/tb_qspi.v
 TOPLEVEL = tb_qspi
 
+# Verilator settings
+include verilator.mk
+
 # MODULE is the basename of the Python test file
 MODULE = test_$(PROG)
 
 # include cocotb's make rules to take care of the simulator setup
 include $(shell cocotb-config --makefiles)/Makefile.sim
+
+ifneq ($(filter %.flash.hex,$(PROG_FILE)),)
+$(PROG_FILE): $(PROG_ELF)
+	python elf.py hex $< $@
+
+clean::
+	rm -f $(PROG_FILE)
+endif
@@ -0,0 +1,146 @@
+# Runs the program given by PROG_FILE at each QSPI latency setting and
+# measures how well it uses the QSPI bus, for sweep.py.
+#
+# The program runs from the end of reset until the PC reaches SWEEP_END (a
+# symbol of an ELF program, or an address), until the program prints
+# SWEEP_END_TEXT on the UART, or otherwise for SWEEP_CYCLES clock cycles.
+# For each latency in SWEEP_LATENCIES (default 1,2,3) the following are
+# written to SWEEP_REPORT (default sweep.json):
+#   cycles        Clock cycles taken
+#   instrs        Instructions completed
+#   ipc           Instructions per cycle
+#   qspi_busy     Cycles with a memory selected
+#   qspi_stall    Cycles with a memory selected and qspi_clk_out stopped,
+#                 while TinyQV waits to use or store the data
+#   transactions  QSPI transactions, for each memory
+#   data_bytes    Bytes read or written, excluding commands, addresses and
+#                 dummy cycles
+#   fetch_eff     Fraction of the busy cycles spent transferring data
+
+import json
+import os
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles, RisingEdge
+
+import qspi_model
+from test_util import reset, wait_for_pc, UartMonitor
+
+LATENCIES = [int(latency) for latency in os.environ.get("SWEEP_LATENCIES", "1,2,3").split(",")]
+END = os.environ.get("SWEEP_END")
+END_TEXT = os.environ.get("SWEEP_END_TEXT")
+CYCLES = int(os.environ.get("SWEEP_CYCLES", 100000))
+TIMEOUT_US = int(os.environ.get("SWEEP_TIMEOUT_US", 10000))
+REPORT_FILE = os.environ.get("SWEEP_REPORT", "sweep.json")
+
+# Number of QSPI clocks before the data of a transaction: the flash is read
+# with 6 address, 2 mode and 4 dummy nibbles, the RAMs with a 2 nibble
+# command, 6 address nibbles and, for reads, 4 dummy nibbles.
+FLASH_HEADER = 12
+RAM_READ_HEADER = 12
+RAM_WRITE_HEADER = 8
+RAM_WRITE_CMD = 0x02
+
+class BusCounters:
+    def __init__(self, dut):
+        self.dut = dut
+        self.cycles = 0
+        self.instrs = 0
+        self.busy = 0
+        self.stall = 0
+        self.transactions = {"flash": 0, "ram_a": 0, "ram_b": 0}
+        self.data_nibbles = 0
+        self.task = cocotb.start_soon(self.run())
+
+    def stop(self):
+        self.task.kill()
+
+    async def run(self):
+        dut = self.dut
+        instr_complete = dut.user_project.debug_instr_complete
+        qspi_clk = dut.qspi_clk_out
+        selects = (("flash", dut.qspi_flash_select), ("ram_a", dut.qspi_ram_a_select), ("ram_b", dut.qspi_ram_b_select))
+        memory = None
+        last_clk = 0
+
+        while True:
+            await RisingEdge(dut.clk)
+            self.cycles += 1
+            if instr_complete.value == 1:
+                self.instrs += 1
+
+            selected = next((name for name, select in selects if select.value == 0), None)
+            if selected != memory:
+                if memory is not None:
+                    self.end_transaction(memory, clocks, cmd)
+                memory = selected
+                clocks = 0
+                cmd = 0
+                if memory is not None:
+                    self.transactions[memory] += 1
+            if memory is None:
+                last_clk = qspi_clk.value
+                continue
+
+            self.busy += 1
+            clk = qspi_clk.value
+            if clk == last_clk:
+                self.stall += 1
+            elif clk == 1:
+                clocks += 1
+                if clocks <= 2:
+                    cmd = (cmd << 4) | (dut.qspi_data_out.value.integer & dut.qspi_data_oe.value.integer)
+            last_clk = clk
+
+    def end_transaction(self, memory, clocks, cmd):
+        if memory == "flash":
+            header = FLASH_HEADER
+        elif cmd == RAM_WRITE_CMD:
+            header = RAM_WRITE_HEADER
+        else:
+            header = RAM_READ_HEADER
+        self.data_nibbles += max(0, clocks - header)
+
+    def report(self):
+        return {
+            "cycles": self.cycles,
+            "instrs": self.instrs,
+            "ipc": round(self.instrs / self.cycles, 3) if self.cycles else 0,
+            "qspi_busy": self.busy,
+            "qspi_stall": self.stall,
+            "transactions": self.transactions,
+            "data_bytes": self.data_nibbles // 2,
+            # Each nibble of data takes a cycle with qspi_clk_out low and one high
+            "fetch_eff": round(2 * self.data_nibbles / self.busy, 3) if self.busy else 0,
+        }
+
+async def run_program(dut):
+    if END is not None:
+        await wait_for_pc(dut, int(END, 16) if END.startswith("0x") else END, TIMEOUT_US)
+    elif END_TEXT is not None:
+        uart = UartMonitor(dut)
+        await uart.readline(END_TEXT)
+        uart.stop()
+    else:
+        await ClockCycles(dut.clk, CYCLES)
+
+@cocotb.test()
+async def test_sweep(dut):
+    clock = Clock(dut.clk, 15.624, units="ns")
+    cocotb.start_soon(clock.start())
+
+    report = {}
+    for latency in LATENCIES:
+        # Reload the program, in case it changed its data in the RAMs
+        if qspi_model.model is not None and os.environ.get("PROG_FILE"):
+            qspi_model.model.load(os.environ["PROG_FILE"])
+        await reset(dut, latency)
+        counters = BusCounters(dut)
+        await run_program(dut)
+        counters.stop()
+        report[str(latency)] = counters.report()
+        dut._log.info(f"Latency {latency}: {report[str(latency)]}")
+
+    with open(REPORT_FILE, "w") as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,26 @@
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import ClockCycles
+
+from test_util import reset, wait_for_pc, peek
+
+# Runs symbols.elf, see symbols.S
+@cocotb.test()
+async def test_symbols(dut):
+    clock = Clock(dut.clk, 15.624, units="ns")
+    cocotb.start_soon(clock.start())
+
+    for latency in range(1, 4):
+        await reset(dut, latency)
+
+        await wait_for_pc(dut, "main", 100)
+        assert peek(dut, "magic") == 0x12345678
+        assert peek(dut, "magic", 2) == 0x5678
+
+        await wait_for_pc(dut, "done", 200)
+
+        # Give the stores before done time to complete
+        await ClockCycles(dut.clk, 200)
+        assert peek(dut, "counter") == 5
+        assert peek(dut, "copy") == 0x12345678
+        assert peek(dut, "counter", 8) == 0x12345678_00000005
@@ -1,75 +1,93 @@
 # SPDX-FileCopyrightText: © 2024 Michael Bell
 # SPDX-License-Identifier: MIT
 
+import csv
+import json
+import os
 import random
+import re
 
 import cocotb
 from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, Timer
 import cocotb.utils
 
-from test_util import reset
+from test_util import reset, UartMonitor
 
-async def receive_string(dut, str):
-    for char in str:
-        dut._log.debug(f"Wait for: {char}")
+# The firmware times a call to a function for each kind of access, which does
+# 100 loads and 100 stores, and prints the name of the access and the number of
+# cycles taken.  The call and the function are 204 instructions.
+INSTRS_PER_RESULT = 204
+NUM_RESULTS = 10
 
-        for _ in range(5000):
-            await ClockCycles(dut.clk, 8)
-            if dut.uart_tx.value == 0:
-                break
-        else:
-            # Should have started by now
-            assert dut.uart_tx.value == 0
-        
-        uart_byte = ord(char)
-        bit_time = 8680
-        await Timer(bit_time / 2, "ns")
-        assert dut.uart_tx.value == 0
-        for i in range(8):
-            await Timer(bit_time, "ns")
-            assert dut.uart_tx.value == (uart_byte & 1)
-            uart_byte >>= 1
-        await Timer(bit_time, "ns")
-        assert dut.uart_tx.value == 1
+CLOCK_PERIOD_NS = 15.624
 
-async def read_string(dut):
-    str = ""
-    while not str.endswith('\r'):
-        for _ in range(25000):
-            await ClockCycles(dut.clk, 8)
-            if dut.uart_tx.value == 0:
-                break
-        else:
-            # Should have started by now
-            dut._log.info(f"Received before fail: {str}")
-            assert dut.uart_tx.value == 0
-        
-        uart_byte = 0
-        bit_time = 8680
-        await Timer(bit_time / 2, "ns")
-        assert dut.uart_tx.value == 0
-        for i in range(8):
-            await Timer(bit_time, "ns")
-            uart_byte |= dut.uart_tx.value << i
-        await Timer(bit_time, "ns")
-        assert dut.uart_tx.value == 1
-        str += chr(uart_byte)
-        dut._log.debug(f"Recvd: {chr(uart_byte)}")
-    return str
+# The results are written to REPORT_FILE as JSON and to the same name with a
+# .csv extension as CSV.  If BASELINE_FILE exists, the test fails if any of the
+# cycle counts are more than THRESHOLD percent higher than in the baseline.
+# To update the baseline, copy the report over it.
+REPORT_FILE = os.environ.get("THROUGHPUT_REPORT", "throughput.json")
+BASELINE_FILE = os.environ.get("THROUGHPUT_BASELINE", "throughput_baseline.json")
+THRESHOLD = float(os.environ.get("THROUGHPUT_THRESHOLD", 5))
+
+def write_report(report):
+    with open(REPORT_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+    with open(os.path.splitext(REPORT_FILE)[0] + ".csv", "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["latency", "access", "cycles", "ipc", "cycles_per_char"])
+        for latency, results in report.items():
+            for access, result in results["accesses"].items():
+                writer.writerow([latency, access, result["cycles"], result["ipc"], results["cycles_per_char"]])
+
+def find_regressions(report, baseline):
+    regressions = []
+    for latency, results in report.items():
+        if latency not in baseline:
+            continue
+        counts = {access: result["cycles"] for access, result in results["accesses"].items()}
+        counts["cycles_per_char"] = results["cycles_per_char"]
+        base_counts = {access: result["cycles"] for access, result in baseline[latency]["accesses"].items()}
+        base_counts["cycles_per_char"] = baseline[latency]["cycles_per_char"]
+        for name, count in counts.items():
+            if name in base_counts and count > base_counts[name] * (1 + THRESHOLD / 100):
+                regressions.append(f"latency {latency} {name}: {base_counts[name]} -> {count}")
+    return regressions
 
 @cocotb.test()
 async def test_throughput(dut):
     dut._log.debug("Start")
-  
+
     # Our example module doesn't use clock and reset, but we show how to use them here anyway.
     clock = Clock(dut.clk, 15.624, units="ns")
     cocotb.start_soon(clock.start())
 
+    report = {}
     for latency in range(1, 4):
-        start_time = cocotb.utils.get_sim_time("ns")
         await reset(dut, latency)
+        uart = UartMonitor(dut)
+        start_time = cocotb.utils.get_sim_time("ns")
 
-        for i in range(10):
-            s = await read_string(dut)
+        accesses = {}
+        num_chars = 0
+        for i in range(NUM_RESULTS):
+            s = await uart.readline("\r")
             dut._log.info(f"Received: {s}")
+            num_chars += len(s)
+            match = re.fullmatch(r"\s*(\w+) (\d+)\s*", s)
+            assert match is not None, f"Unexpected output {s!r}"
+            cycles = int(match.group(2))
+            accesses[match.group(1)] = {"cycles": cycles, "ipc": round(INSTRS_PER_RESULT / cycles, 3)}
+        uart.stop()
+
+        run_cycles = (cocotb.utils.get_sim_time("ns") - start_time) / CLOCK_PERIOD_NS
+        report[str(latency)] = {"accesses": accesses, "cycles_per_char": round(run_cycles / num_chars)}
+        dut._log.info(f"Latency {latency}: " + ", ".join(f"{access} IPC {result['ipc']}" for access, result in accesses.items()))
+
+    write_report(report)
+
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(report, baseline)
+        assert not regressions, f"Throughput regressed by more than {THRESHOLD}%: " + "; ".join(regressions)
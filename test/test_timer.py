@@ -8,55 +8,7 @@ from cocotb.clock import Clock
 from cocotb.triggers import ClockCycles, Timer
 import cocotb.utils
 
-from test_util import reset
-
-async def receive_string(dut, str):
-    for char in str:
-        dut._log.debug(f"Wait for: {char}")
-
-        for _ in range(5000):
-            await ClockCycles(dut.clk, 8)
-            if dut.uart_tx.value == 0:
-                break
-        else:
-            # Should have started by now
-            assert dut.uart_tx.value == 0
-        
-        uart_byte = ord(char)
-        bit_time = 8680
-        await Timer(bit_time / 2, "ns")
-        assert dut.uart_tx.value == 0
-        for i in range(8):
-            await Timer(bit_time, "ns")
-            assert dut.uart_tx.value == (uart_byte & 1)
-            uart_byte >>= 1
-        await Timer(bit_time, "ns")
-        assert dut.uart_tx.value == 1
-
-async def read_string(dut):
-    str = ""
-    while not str.endswith('\r'):
-        for _ in range(25000):
-            await ClockCycles(dut.clk, 8)
-            if dut.uart_tx.value == 0:
-                break
-        else:
-            # Should have started by now
-            dut._log.info(f"Received before fail: {str}")
-            assert dut.uart_tx.value == 0
-        
-        uart_byte = 0
-        bit_time = 8680
-        await Timer(bit_time / 2, "ns")
-        assert dut.uart_tx.value == 0
-        for i in range(8):
-            await Timer(bit_time, "ns")
-            uart_byte |= dut.uart_tx.value << i
-        await Timer(bit_time, "ns")
-        assert dut.uart_tx.value == 1
-        str += chr(uart_byte)
-        dut._log.debug(f"Recvd: {chr(uart_byte)}")
-    return str
+from test_util import reset, UartMonitor
 
 @cocotb.test()
 async def test_timer(dut):
@@ -69,7 +21,9 @@ async def test_timer(dut):
     for latency in range(1, 4):
         start_time = cocotb.utils.get_sim_time("ns")
         await reset(dut, latency)
+        uart = UartMonitor(dut)
 
         for i in range(2):
-            s = await read_string(dut)
+            s = await uart.readline("\r")
             dut._log.info(f"Received: {s}")
+        uart.stop()
@@ -1,12 +1,47 @@
+import atexit
+import os
 import random
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
 
 import cocotb
-from cocotb.triggers import ClockCycles, Timer
+from cocotb.triggers import ClockCycles, Edge, Event, First, Timer, FallingEdge
+from cocotb.utils import get_sim_time
 
 from riscvmodel.insn import *
 
 from riscvmodel.regnames import x0, gp, tp, a0
 
+import elf
+import harness_profile
+import pc_profile
+import qspi_model
+
+
+# Benchmarking
+# If the TQV_CALLBACK_FILE environment variable is set, the number of callbacks
+# from the simulator into cocotb is counted, and written to that file when the
+# simulation ends.  This is used by benchmark.py.
+def count_callbacks(filename):
+    scheduler = cocotb.scheduler
+    react = scheduler._react
+    count = 0
+
+    def counting_react(trigger):
+        nonlocal count
+        count += 1
+        react(trigger)
+
+    def write_count():
+        with open(filename, "w") as f:
+            f.write(f"{count}\n")
+
+    scheduler._react = counting_react
+    atexit.register(write_count)
+
+if os.environ.get("TQV_CALLBACK_FILE") and cocotb.scheduler is not None:
+    count_callbacks(os.environ["TQV_CALLBACK_FILE"])
 
 async def reset(dut, latency=1, ui_in=0x80):
     # Reset
@@ -18,6 +53,7 @@ async def reset(dut, latency=1, ui_in=0x80):
     dut.uio_in[6].value = 0
     dut.uio_in[7].value = 0
     dut.qspi_data_in.value = 0
+    await clear_feeder(dut)
     dut.rst_n.value = 1
     dut.uart_rx.value = 1
     await ClockCycles(dut.clk, 2)
@@ -27,6 +63,10 @@ async def reset(dut, latency=1, ui_in=0x80):
     assert dut.uio_oe.value == 0
     await ClockCycles(dut.clk, 9)
     dut.rst_n.value = 1
+    if os.environ.get("QSPI_MODEL") == "python":
+        qspi_model.start(dut)
+    if os.environ.get("PC_PROFILE"):
+        pc_profile.start(dut)
     await ClockCycles(dut.clk, 1)
     assert dut.uio_oe.value == 0b11001001
 
@@ -142,10 +182,75 @@ async def start_write(dut, addr):
 
 nibble_shift_order = [4, 0, 12, 8, 20, 16, 28, 24]
 
-async def send_instr(dut, data, ok_to_exit=False, allow_long_delay=False):
+# Encoding an instruction with riscvmodel is relatively slow, and tests encode
+# the same few instructions over and over, so the encoded words are cached.
+# Usage: encode(InstructionADDI, a1, x0, 5) == InstructionADDI(a1, x0, 5).encode()
+@lru_cache(maxsize=4096)
+def encode(insn, *args):
+    return insn(*args).encode()
+
+# The nibbles of an encoded instruction, in the order they are read over QSPI.
+@lru_cache(maxsize=4096)
+def instr_nibbles(data):
     instr_len = 8 if (data & 3) == 3 else 4
+    return tuple((data >> nibble_shift_order[i]) & 0xF for i in range(instr_len))
+
+NOP = encode(InstructionADDI, x0, x0, 0)
+
+# Instruction feeder
+# When enabled, instructions sent with send_instr are queued and then loaded
+# in bulk into the feeder in tb.v, which answers the instruction fetches
+# without a Python callback per clock.  The queue is flushed before anything
+# that needs to observe the design, so the behaviour seen by tests is unchanged.
+# The feeder is only used if the INSTR_FEEDER environment variable is set to 1.
+FEED_NIBBLES = 256
+feeder_enabled = False
+feed_queue = []
+
+def enable_feeder(dut, enable=True):
+    global feeder_enabled
+    feeder_enabled = (enable and os.environ.get("INSTR_FEEDER", "0") == "1" and
+                      hasattr(dut, "feed_count"))
+
+async def clear_feeder(dut):
+    global feeder_enabled, feed_queue
+    feeder_enabled = False
+    feed_queue = []
+    if hasattr(dut, "feed_count"):
+        dut.feed_count.value = 0
+        dut.feed_error.value = 0
+        dut.feed_idle.value = 0
+        dut.feed_idle_busy.value = 0
+        dut.feed_idle_pos.value = 0
+
+# Wait until all queued instructions have been read by TinyQV
+async def flush_instrs(dut):
+    global feed_queue
+    while len(feed_queue) != 0:
+        nibbles = feed_queue[:FEED_NIBBLES]
+        feed_queue = feed_queue[FEED_NIBBLES:]
+        data = 0
+        for nibble in reversed(nibbles):
+            data = (data << 4) | nibble
+        dut.feed_data.value = data
+        dut.feed_count.value = len(nibbles)
+        await FallingEdge(dut.feed_busy)
+        assert dut.feed_error.value == 0
+
+async def send_instr(dut, data, ok_to_exit=False, allow_long_delay=False):
+    if feeder_enabled and not ok_to_exit:
+        feed_queue.extend(instr_nibbles(data))
+        if len(feed_queue) >= FEED_NIBBLES:
+            await flush_instrs(dut)
+    else:
+        await drive_instr(dut, data, ok_to_exit, allow_long_delay)
+
+# Send an instruction by driving the QSPI data in from Python
+async def drive_instr(dut, data, ok_to_exit=False, allow_long_delay=False):
+    nibbles = instr_nibbles(data)
+    instr_len = len(nibbles)
     for i in range(instr_len):
-        dut.qspi_data_in.value = (data >> (nibble_shift_order[i])) & 0xF
+        dut.qspi_data_in.value = nibbles[i]
         await ClockCycles(dut.clk, 1, False)
         for _ in range(400 if allow_long_delay else 20):
             if ok_to_exit and dut.qspi_flash_select.value == 1:
@@ -165,6 +270,8 @@ async def send_instr(dut, data, ok_to_exit=False, allow_long_delay=False):
             assert dut.qspi_flash_select.value == 0
 
 async def expect_load(dut, addr, val, bytes=4):
+    await flush_instrs(dut)
+
     if addr >= 0x1800000:
         select = dut.qspi_ram_b_select
     elif addr >= 0x1000000:
@@ -205,36 +312,104 @@ async def expect_load(dut, addr, val, bytes=4):
 
 async def load_reg(dut, reg, value):
     offset = random.randint(-0x400, 0x3FF)
-    instr = InstructionLW(reg, gp, offset).encode()
+    instr = encode(InstructionLW, reg, gp, offset)
     await send_instr(dut, instr)
 
     await expect_load(dut, 0x1000400 + offset, value)
 
 
-send_nops = True
-nop_task = None
-
-async def nops_loop(dut):
-    while send_nops:
-        await send_instr(dut, InstructionADDI(x0, x0, 0).encode())
+# Idle engine
+# Keeps TinyQV executing NOPs while the test isn't sending instructions.
+# If the instruction feeder is enabled the NOPs are generated by the feeder in
+# the testbench with no Python work per cycle, otherwise they are sent by a
+# cocotb coroutine.
+class IdleEngine:
+    def __init__(self, dut):
+        self.dut = dut
+        self.use_feeder = False
+        self.send_nops = False
+        self.nop_task = None
+
+    async def nops_loop(self):
+        while self.send_nops:
+            await drive_instr(self.dut, NOP)
+
+    async def start(self):
+        await flush_instrs(self.dut)
+        self.send_nops = True
+        self.use_feeder = feeder_enabled
+        if self.use_feeder:
+            self.dut.feed_idle.value = 1
+            self.dut.feed_idle_busy.value = 1
+        else:
+            self.nop_task = cocotb.start_soon(self.nops_loop())
+
+        # This ensures that the nop task is actually started, so that it can be instantly stopped.
+        await Timer(2, "ps")
+
+    # Stop sending NOPs, returns once the NOP in progress has been read.
+    async def stop(self):
+        self.send_nops = False
+        if self.use_feeder:
+            self.dut.feed_idle.value = 0
+            if self.dut.feed_idle_busy.value == 1:
+                await FallingEdge(self.dut.feed_idle_busy)
+            assert self.dut.feed_error.value == 0
+            self.use_feeder = False
+        elif self.nop_task is not None:
+            await self.nop_task
+        self.nop_task = None
+
+# The idle engine used by start_nops and stop_nops
+idle_engine = None
 
 async def start_nops(dut):
-    global send_nops, nop_task
-    send_nops = True
-    nop_task = cocotb.start_soon(nops_loop(dut))
-
-    # This ensures that the nop task is actually started, so that it can be instantly stopped.
-    await Timer(2, "ps")
+    global idle_engine
+    if idle_engine is None or idle_engine.dut is not dut:
+        idle_engine = IdleEngine(dut)
+    await idle_engine.start()
 
 async def stop_nops():
-    global send_nops, nop_task
-    send_nops = False
-    if nop_task is not None:
-        await nop_task
-    nop_task = None
+    if idle_engine is not None:
+        await idle_engine.stop()
+
+# Wave dumping
+# When running with WAVES=marked, waves are only dumped inside the regions
+# marked with waves() or dump_window().  In other modes these do nothing.
+def waves_marked():
+    return "dumpoff" in cocotb.plusargs
+
+def set_waves(dut, on):
+    if waves_marked():
+        dut.waves_on.value = 1 if on else 0
+
+# Dump waves while inside this context, for example:
+#   with waves(dut):
+#       await tqv.write_reg(0, 1)
+@contextmanager
+def waves(dut):
+    set_waves(dut, True)
+    try:
+        yield
+    finally:
+        set_waves(dut, False)
+
+# Dump waves between the simulation times start and stop, in units.
+# Returns the task that switches the dump on and off.
+def dump_window(dut, start, stop, units="ns"):
+    async def window():
+        now = get_sim_time(units)
+        if start > now:
+            await Timer(start - now, units)
+        if stop > max(start, now):
+            set_waves(dut, True)
+            await Timer(stop - max(start, now), units)
+            set_waves(dut, False)
+
+    return cocotb.start_soon(window())
 
 async def read_byte(dut, reg, expected_val):
-  await send_instr(dut, InstructionSW(tp, reg, 0x18).encode())
+  await send_instr(dut, encode(InstructionSW, tp, reg, 0x18))
 
   await start_nops(dut)
   for i in range(80):
@@ -256,6 +431,8 @@ async def read_byte(dut, reg, expected_val):
   await stop_nops()
 
 async def expect_store(dut, addr, bytes=4, allow_long_delay=False):
+    await flush_instrs(dut)
+
     if addr >= 0x1800000:
         select = dut.qspi_ram_b_select
     elif addr >= 0x1000000:
@@ -277,7 +454,7 @@ async def expect_store(dut, addr, bytes=4, allow_long_delay=False):
                     await ClockCycles(dut.clk, 1, False)
                 assert dut.qspi_clk_out.value == 1
                 assert dut.qspi_data_oe.value == 0xF
-                val |= dut.qspi_data_out.value << (nibble_shift_order[j % 8])
+                val |= dut.qspi_data_out.value << (nibble_shift_order[j % 8] + 32 * (j // 8))
                 await ClockCycles(dut.clk, 1, False)
                 assert select.value == (1 if j == bytes*2-1 else 0)
                 assert dut.qspi_clk_out.value == 0
@@ -304,16 +481,209 @@ async def expect_store(dut, addr, bytes=4, allow_long_delay=False):
 
     return val
 
+# Run a polling loop on TinyQV.  body is a list of encoded instructions that
+# ends with a branch back to the start of body, which is taken while the loop
+# should continue, followed by a store that is executed once the loop exits.
+# The body is driven from Python again each time the branch restarts the
+# instruction fetch, by starting a new flash read and driving each instruction
+# on the bus.  This bypasses the instruction feeder in tb.v, whose queue is
+# flushed first.
+# Returns the number of clock cycles until the loop exited, the store should
+# then be read with expect_store.
+async def poll_loop(dut, body, timeout_cycles):
+    await flush_instrs(dut)
+
+    start_time = get_sim_time("ps")
+    period = None
+    while True:
+        for instr in body:
+            if dut.qspi_flash_select.value == 1:
+                break
+            await drive_instr(dut, instr, True)
+
+        # Send compressed NOPs until the fetch stops for the branch or the store
+        while dut.qspi_flash_select.value == 0:
+            await drive_instr(dut, 0x0001, True)
+
+        for i in range(12):
+            cycle_time = get_sim_time("ps")
+            await ClockCycles(dut.clk, 1, False)
+            period = get_sim_time("ps") - cycle_time
+            cycles = (get_sim_time("ps") - start_time) // period
+            if dut.qspi_ram_a_select.value == 0 or dut.qspi_ram_b_select.value == 0:
+                return cycles
+            if dut.qspi_flash_select.value == 0:
+                break
+        else:
+            assert False
+
+        assert cycles < timeout_cycles, "Timed out polling"
+
+        # The branch was taken, the fetch restarts at the start of the loop
+        if hasattr(dut.user_project, "i_tinyqv"):
+            await start_read(dut, dut.user_project.i_tinyqv.instr_addr.value.integer * 2)
+        else:
+            await start_read(dut, None)
+
 async def read_reg(dut, reg, allow_long_delay=False):
     offset = random.randint(-0x400, 0x3FF)
-    instr = InstructionSW(gp, reg, offset).encode()
+    instr = encode(InstructionSW, gp, reg, offset)
     await send_instr(dut, instr)
 
     return await expect_store(dut, 0x1000400 + offset, 4, allow_long_delay)
 
+# Read four consecutive registers, starting at reg, using a single multi-word store.
+# Returns a list of the four values.
+async def read_reg4(dut, reg, allow_long_delay=False):
+    offset = random.randint(-0x40, 0x3F) * 16
+    instr = encode(InstructionSW, gp, reg, offset) | (7 << 12)
+    await send_instr(dut, instr)
+
+    val = await expect_store(dut, 0x1000400 + offset, 16, allow_long_delay)
+    return [(val >> (32 * i)) & 0xFFFFFFFF for i in range(4)]
+
 async def set_all_outputs_to_peripheral(dut, peripheral_num):
-    await send_instr(dut, InstructionADDI(a0, x0, 0xc0).encode())
-    await send_instr(dut, InstructionSW(tp, a0, 0xc).encode())
-    await send_instr(dut, InstructionADDI(a0, x0, peripheral_num).encode())
+    await send_instr(dut, encode(InstructionADDI, a0, x0, 0xc0))
+    await send_instr(dut, encode(InstructionSW, tp, a0, 0xc))
+    await send_instr(dut, encode(InstructionADDI, a0, x0, peripheral_num))
     for func_sel in range(0x60, 0x80, 4):
-        await send_instr(dut, InstructionSW(tp, a0, func_sel).encode())
+        await send_instr(dut, encode(InstructionSW, tp, a0, func_sel))
+
+# UART receiver
+# Decodes the bytes sent on a UART TX pin in a background task, which only
+# wakes on the falling edge of each start bit and then at the middle of each
+# bit, rather than polling the pin.  Create it after reset, for example:
+#   uart = UartMonitor(dut)
+#   await uart.expect("Hello, world!\r\n")
+#   line = await uart.readline()
+# Each method waiting for a byte fails if it hasn't been received within timeout_us.
+# The defaults allow as long as the polling loops this replaced: 25000 x 8
+# clocks for the start of a line, or 5000 x 8 clocks for expected text, plus
+# the 87us taken to send the byte.
+class UartMonitor:
+    def __init__(self, dut, pin=None, bit_time=8680):
+        self.dut = dut
+        self.pin = dut.uart_tx if pin is None else pin
+        self.bit_time = bit_time
+        self.received = deque()
+        self.byte_received = Event()
+        self.task = cocotb.start_soon(self.receive_loop())
+
+    async def receive_loop(self):
+        while True:
+            await FallingEdge(self.pin)
+            await Timer(self.bit_time / 2, "ns")
+            if self.pin.value != 0:
+                # Glitch, not a start bit
+                continue
+            uart_byte = 0
+            for i in range(8):
+                await Timer(self.bit_time, "ns")
+                uart_byte |= self.pin.value << i
+            await Timer(self.bit_time, "ns")
+            # The byte is only checked by the reader, so that a framing error is reported in the test
+            self.received.append(uart_byte if self.pin.value == 1 else None)
+            self.byte_received.set()
+
+    # Stop receiving, for example before resetting the design
+    def stop(self):
+        self.task.kill()
+
+    # Discard any bytes received but not yet read
+    def clear(self):
+        self.received.clear()
+
+    async def read_byte(self, timeout_us=3300):
+        if not self.received:
+            self.byte_received.clear()
+            timeout = Timer(timeout_us, "us")
+            if await First(self.byte_received.wait(), timeout) is timeout:
+                assert False, f"Timed out waiting for a byte on {self.pin._name}"
+        uart_byte = self.received.popleft()
+        assert uart_byte is not None, f"Framing error on {self.pin._name}"
+        self.dut._log.debug(f"Recvd: {chr(uart_byte)}")
+        return uart_byte
+
+    # Returns the text received up to and including the next end character
+    async def readline(self, end="\n", timeout_us=3300):
+        text = ""
+        while not text.endswith(end):
+            try:
+                text += chr(await self.read_byte(timeout_us))
+            except AssertionError:
+                self.dut._log.info(f"Received before fail: {text}")
+                raise
+        return text
+
+    # Check that the next bytes received are the given text
+    async def expect(self, text, timeout_us=720):
+        for char in text:
+            self.dut._log.debug(f"Wait for: {char}")
+            uart_byte = await self.read_byte(timeout_us)
+            assert uart_byte == ord(char), f"Expected {char!r}, received {chr(uart_byte)!r}"
+
+# Program symbols
+# When the program run by test_prog.mk is an ELF file, tests can use its
+# symbols to wait for the program to reach a function, or to read a variable
+# from the simulated memory, for example:
+#   await wait_for_pc(dut, "main")
+#   assert peek(dut, "counter") == 5
+# Addresses can be given instead of symbols.
+@lru_cache(maxsize=None)
+def prog_symbols():
+    assert os.environ.get("PROG_ELF"), "Symbols are only available when PROG_FILE is an ELF file"
+    return elf.Elf(os.environ["PROG_ELF"]).symbols
+
+def symbol_address(symbol):
+    if isinstance(symbol, int):
+        return symbol
+    assert symbol in prog_symbols(), f"Unknown symbol {symbol}"
+    return prog_symbols()[symbol].address
+
+# Wait for TinyQV to fetch the instruction at a symbol or address.  As for
+# expect_load and pc_profile.py, this watches the fetch address, instr_addr,
+# in halfwords.  The fetch runs a few instructions ahead of execution, and
+# may step over the address by a halfword, so any fetch address within the
+# 4 bytes from the address matches.
+async def wait_for_pc(dut, symbol, timeout_us=10000):
+    addr = symbol_address(symbol)
+    instr_addr = dut.user_project.i_tinyqv.instr_addr
+
+    async def watch_pc():
+        while not instr_addr.value.is_resolvable or not 0 <= instr_addr.value.integer * 2 - addr < 4:
+            await Edge(instr_addr)
+
+    watch = cocotb.start_soon(watch_pc())
+    timeout = Timer(timeout_us, "us")
+    if await First(watch, timeout) is timeout:
+        watch.kill()
+        assert False, f"Timed out waiting for the PC to reach {symbol}"
+
+# Read size bytes of memory at a symbol or address, size defaults to the size
+# of the symbol.  Returns the little endian value.
+def peek(dut, symbol, size=None):
+    addr = symbol_address(symbol)
+    if size is None:
+        size = (prog_symbols()[symbol].size if isinstance(symbol, str) else 0) or 4
+
+    if addr < elf.RAM_A_ADDR:
+        name, offset = "flash", addr - elf.FLASH_ADDR
+    elif addr < elf.RAM_B_ADDR:
+        name, offset = "ram_a", addr - elf.RAM_A_ADDR
+    else:
+        name, offset = "ram_b", addr - elf.RAM_B_ADDR
+
+    if qspi_model.model is not None:
+        memory = getattr(qspi_model.model, name)
+        data = bytes(memory.data[(offset + i) % memory.size] for i in range(size))
+    else:
+        array = getattr(dut.qspi, "rom" if name == "flash" else name)
+        data = bytes(array[(offset + i) % len(array)].value.integer for i in range(size))
+    return int.from_bytes(data, "little")
+
+if harness_profile.enabled:
+    harness_profile.profile_functions(globals(), [
+        "reset", "start_read", "start_write", "flush_instrs", "send_instr", "expect_load", "load_reg",
+        "start_nops", "stop_nops", "read_byte", "expect_store", "read_reg", "read_reg4", "wait_for_pc"])
+    harness_profile.profile_class(IdleEngine)
+    harness_profile.profile_class(UartMonitor)
@@ -1,18 +1,61 @@
-from cocotb.triggers import ClockCycles
+import os
+import random
+from contextlib import asynccontextmanager
+
+import cocotb
+from cocotb.handle import Force, Release
+from cocotb.triggers import ClockCycles, Edge, FallingEdge, First
+from cocotb.utils import get_sim_time
 
 from riscvmodel.insn import *
-from riscvmodel.regnames import x0, tp, a0, a1
+from riscvmodel.regnames import x0, gp, tp, a0, a1, a2, a3
 from riscvmodel import csrnames
 
+import harness_profile
 import test_util
 
+# Encoding of the access width on the peripheral bus read_n and write_n signals
+BUS_WIDTH_N = {8: 0b00, 16: 0b01, 32: 0b10}
+
+# Maximum number of clocks a peripheral may take to respond to a backdoor read
+BACKDOOR_READ_TIMEOUT = 1000
+
+# Whether backdoor access can be used: it needs the RTL of the peripherals
+# block, and forces its ports, which Verilator doesn't support.
+def backdoor_supported(dut):
+    return hasattr(dut.user_project, "i_peripherals") and not (cocotb.SIM_NAME or "").lower().startswith("verilator")
+
+# The access mode for test vectors that only check a peripheral's own
+# behaviour: TQV_ACCESS if it is set, otherwise backdoor where it can be used.
+def bulk_access(dut):
+    if os.environ.get("TQV_ACCESS"):
+        return os.environ["TQV_ACCESS"]
+    return "backdoor" if backdoor_supported(dut) else "frontdoor"
+
+# Convert the bottom 12 bits of value to a signed immediate
+def to_imm12(value):
+    value &= 0xfff
+    return value - 0x1000 if value >= 0x800 else value
+
 # This class provides access to the peripheral's registers.
 class TinyQV:
 
     # The peripheral number must be provided.
-    def __init__(self, dut, peripheral_num):
+    # access selects how the registers are accessed:
+    #   "frontdoor" - Risc-V load and store instructions are executed by TinyQV
+    #   "backdoor"  - the peripheral's register interface is driven directly,
+    #                 which is much faster but doesn't test the CPU path.
+    #                 Only available in RTL simulation with Icarus.
+    # If access is not given it is taken from the TQV_ACCESS environment variable,
+    # defaulting to frontdoor.  It can be changed with set_access().
+    # If deferred_sync is true, writes with sync set are checked in groups
+    # instead of individually, see deferred_sync() below.
+    def __init__(self, dut, peripheral_num, access=None, deferred_sync=False):
         self.dut = dut
         self.peripheral_num = peripheral_num
+        if access is None:
+            access = os.environ.get("TQV_ACCESS", "frontdoor")
+        self._set_access(access)
         if peripheral_num < 16:
             self.base_address = peripheral_num * 0x40
         elif peripheral_num >= 32:
@@ -20,46 +63,57 @@ class TinyQV:
         else:
             self.base_address = 0x300 + peripheral_num * 0x10
 
+        # Keeps the CPU executing NOPs between register accesses
+        self.idle = test_util.IdleEngine(dut)
+
+        # State for register accesses grouped with batch()
+        self.in_batch = False
+        self.batch_pending_value = None
+
+        # Values of deferred writes, held in a1-a4, still to be checked
+        self.defer_sync = deferred_sync
+        self.pending_sync = []
+
+        # Known contents of the CPU registers used for register accesses,
+        # so that loading values into them can be avoided or shortened.
+        # Code that sends instructions directly with test_util while this
+        # object is in use must call forget_regs() afterwards.
+        self.known_regs = {}
+
     # Reset the design, this reset will initialize TinyQV and connect
     # all inputs and outputs to your peripheral.
     async def reset(self, initial_ui_in=0):
         # Ensure any previously running test is cleaned up
         await test_util.stop_nops()
+        await self.idle.stop()
+        self.pending_sync = []
+        self.forget_regs()
 
         await test_util.reset(self.dut, 1, initial_ui_in)
 
         # Should start reading flash after 1 cycle
         await ClockCycles(self.dut.clk, 1)
         await test_util.start_read(self.dut, 0)
-        
+
+        # Use the instruction feeder in the testbench if it is enabled
+        test_util.enable_feeder(self.dut)
+
         await test_util.set_all_outputs_to_peripheral(self.dut, self.peripheral_num)
 
-        await test_util.start_nops(self.dut)
+        await self.idle.start()
 
     # Write a value to a byte register in your design
     # reg is the address of the register in the range 0-15
     # value is the value to be written, in the range 0-255
     # If sync is false this function will return before the store is completed.
     async def write_reg(self, reg, value, sync=True):
-        await test_util.stop_nops()
-        await test_util.send_instr(self.dut, InstructionADDI(a1, x0, value).encode())
-        await test_util.send_instr(self.dut, InstructionSB(tp, a1, self.base_address + reg).encode())
-
-        if sync:
-            # Read a register in order to ensure the store is complete before returning
-            assert await test_util.read_reg(self.dut, a1) == value
-
-        await test_util.start_nops(self.dut)
+        await self._write(reg, value, 8, sync)
 
     # Read the value of a byte register from your design
     # reg is the address of the register in the range 0-15
     # The returned value is the data read from the register, in the range 0-255
     async def read_reg(self, reg):
-        await test_util.stop_nops()
-        await test_util.send_instr(self.dut, InstructionLBU(a1, tp, self.base_address + reg).encode())
-        val = await test_util.read_reg(self.dut, a1, True)
-        await test_util.start_nops(self.dut)
-        return val
+        return await self._read(reg, 8)
 
     # Write a value to a byte register in your design
     # reg is the address of the register in the range 0-15
@@ -79,70 +133,371 @@ class TinyQV:
     # value is the value to be written, in the range 0-65535
     # If sync is false this function will return before the store is completed.
     async def write_hword_reg(self, reg, value, sync=True):
-        await test_util.stop_nops()
-        # Prepare value for LUI + ADDI
-        value_upper = (value + 0x800) >> 12
-        value_lower = value & 0xfff
-        if value_lower >= 0x800:
-            value_lower -= 0x1000
-
-        await test_util.send_instr(self.dut, InstructionLUI(a1, value_upper).encode())
-        await test_util.send_instr(self.dut, InstructionADDI(a1, a1, value_lower).encode())
-        await test_util.send_instr(self.dut, InstructionSH(tp, a1, self.base_address + reg).encode())
-
-        if sync:
-            # Read a register in order to ensure the store is complete before returning
-            assert await test_util.read_reg(self.dut, a1) == value
-
-        await test_util.start_nops(self.dut)
+        await self._write(reg, value, 16, sync)
 
     # Read the value of a half word register from your design
     # reg is the address of the register in the range 0-15
     # The returned value is the data read from the register, in the range 0-65535
     async def read_hword_reg(self, reg):
-        await test_util.stop_nops()
-        await test_util.send_instr(self.dut, InstructionLHU(a1, tp, self.base_address + reg).encode())
-        val = await test_util.read_reg(self.dut, a1, True)
-        await test_util.start_nops(self.dut)
-        return val
+        return await self._read(reg, 16)
 
     # Write a value to a word register in your design
     # reg is the address of the register in the range 0-15
     # value is the value to be written
     # If sync is false this function will return before the store is completed.
     async def write_word_reg(self, reg, value, sync=True):
-        await test_util.stop_nops()
-
-        # Prepare value for LUI + ADDI
-        value_upper = ((value + 0x800) >> 12) & 0xfffff
-        value_lower = value & 0xfff
-        if value_lower >= 0x800:
-            value_lower -= 0x1000
-
-        await test_util.send_instr(self.dut, InstructionLUI(a1, value_upper).encode())
-        await test_util.send_instr(self.dut, InstructionADDI(a1, a1, value_lower).encode())
-        await test_util.send_instr(self.dut, InstructionSW(tp, a1, self.base_address + reg).encode())
-
-        if sync:
-            # Read a register in order to ensure the store is complete before returning
-            assert await test_util.read_reg(self.dut, a1) == value
-
-        await test_util.start_nops(self.dut)
+        await self._write(reg, value, 32, sync)
 
     # Read the value of a word register from your design
     # reg is the address of the register in the range 0-15
     # The returned value is the data read from the register
     async def read_word_reg(self, reg):
-        await test_util.stop_nops()
-        await test_util.send_instr(self.dut, InstructionLW(a1, tp, self.base_address + reg).encode())
-        val = await test_util.read_reg(self.dut, a1, True)
-        await test_util.start_nops(self.dut)
-        return val
+        return await self._read(reg, 32)
 
     # Check whether the user interrupt is asserted
     async def is_interrupt_asserted(self):
-        await test_util.stop_nops()
-        await test_util.send_instr(self.dut, InstructionCSRRS(a1, x0, csrnames.mip).encode())
-        val = await test_util.read_reg(self.dut, a1)
-        await test_util.start_nops(self.dut)
+        if self.backdoor:
+            return self._interrupt_line_high()
+
+        await self._begin_access()
+        await self._check_pending_sync()
+        await test_util.send_instr(self.dut, test_util.encode(InstructionCSRRS, a1, x0, csrnames.mip))
+        val = await self._read_back(a1)
+        await self._end_access()
         return (val & (1 << (16 + self.peripheral_num))) != 0
+
+    # Group register accesses so that the NOP stream is only stopped once and
+    # the stores are issued back to back.  Writes inside the batch are not
+    # individually synchronised, instead if sync is true a single read back at
+    # the end of the batch ensures all the stores have completed.
+    # For example:
+    #   async with tqv.batch():
+    #       await tqv.write_word_reg(0, 0x12345678)
+    #       await tqv.write_byte_reg(4, 1)
+    @asynccontextmanager
+    async def batch(self, sync=True):
+        assert not self.in_batch, "Batches can't be nested"
+        if self.backdoor:
+            # Backdoor writes complete immediately
+            yield self
+            return
+
+        await self.idle.stop()
+        await self._check_pending_sync()
+        self.in_batch = True
+        self.batch_pending_value = None
+        try:
+            yield self
+            if sync and self.batch_pending_value is not None:
+                src, value = self.batch_pending_value
+                assert await self._read_back(src) == value
+        finally:
+            self.in_batch = False
+            self.batch_pending_value = None
+        await self.idle.start()
+
+    # Wait for the user interrupt to be asserted, failing if it is not
+    # asserted within timeout_cycles clocks.  This watches the interrupt line
+    # without using the CPU, and then confirms the CPU sees the interrupt.
+    async def wait_interrupt(self, timeout_cycles=10000):
+        assert 2 <= self.peripheral_num < 16, "Peripheral has no interrupt"
+        interrupts = self.dut.user_project.i_peripherals.user_interrupts
+
+        async def wait_high():
+            while not self._interrupt_line_high():
+                await Edge(interrupts)
+
+        timeout = ClockCycles(self.dut.clk, timeout_cycles)
+        task = cocotb.start_soon(wait_high())
+        if await First(task, timeout) is timeout:
+            task.kill()
+            assert False, "Timed out waiting for interrupt"
+
+        assert await self.is_interrupt_asserted()
+
+    # Wait until (register value & mask) == expected, failing if this doesn't
+    # happen within timeout_cycles clocks.  width is 8, 16 or 32 bits.
+    # The register is polled by a load and branch loop on TinyQV, see
+    # test_util.poll_loop, so each read doesn't need a store checked by the
+    # test.  The test still drives the loop's instructions on the flash bus
+    # again each time the branch restarts the fetch.
+    # Returns the number of clock cycles taken.
+    async def poll(self, reg, mask, expected, timeout_cycles=10000, width=8):
+        mask &= (1 << width) - 1
+        assert expected & ~mask == 0
+
+        if self.backdoor:
+            await FallingEdge(self.dut.clk)
+            start_time = get_sim_time("ps")
+            await FallingEdge(self.dut.clk)
+            period = get_sim_time("ps") - start_time
+            while True:
+                cycles = (get_sim_time("ps") - start_time) // period
+                if (await self._backdoor_read(reg, width)) & mask == expected:
+                    return cycles
+                assert cycles < timeout_cycles, "Timed out polling"
+
+        await self._begin_access()
+        await self._check_pending_sync()
+
+        # Loop loading the register into a1 until it matches, then store a1
+        insn = {8: InstructionLBU, 16: InstructionLHU, 32: InstructionLW}[width]
+        body = [test_util.encode(insn, a1, tp, self.base_address + reg)]
+        if mask != (1 << width) - 1:
+            await self._load_value(a2, mask)
+            body.append(test_util.encode(InstructionAND, a1, a1, a2))
+        await self._load_value(a3, expected)
+        body.append(test_util.encode(InstructionBNE, a1, a3, -4 * len(body)))
+        offset = random.randint(-0x400, 0x3FF)
+        body.append(test_util.encode(InstructionSW, gp, a1, offset))
+
+        cycles = await test_util.poll_loop(self.dut, body, timeout_cycles)
+        self.batch_pending_value = None
+        val = await test_util.expect_store(self.dut, 0x1000400 + offset)
+        self.known_regs[a1] = val
+        assert val == expected
+
+        await self._end_access()
+        return cycles
+
+    # Write a list of registers in a single batch.
+    # writes is a list of (reg, value, width) tuples, width is 8, 16 or 32 bits
+    # and may be omitted for byte registers.
+    # If sync is false this function will return before the stores are completed.
+    async def write_regs(self, writes, sync=True):
+        async with self.batch(sync):
+            for write in writes:
+                reg, value = write[0], write[1]
+                width = write[2] if len(write) > 2 else 8
+                await self._write(reg, value, width, sync)
+
+    # Read a list of registers, returning a list of their values.
+    # reads is a list of registers, or (reg, width) tuples where width is 8,
+    # 16 or 32 bits.  The registers are loaded into a1-a4, four at a time, and
+    # each group is read back with a single multi-register store.
+    async def read_regs(self, reads):
+        reads = [read if isinstance(read, tuple) else (read, 8) for read in reads]
+        if self.backdoor:
+            return [await self._backdoor_read(reg, width) for reg, width in reads]
+
+        await self._begin_access()
+        await self._check_pending_sync()
+        vals = []
+        for i in range(0, len(reads), 4):
+            group = reads[i:i+4]
+            for j, (reg, width) in enumerate(group):
+                insn = {8: InstructionLBU, 16: InstructionLHU, 32: InstructionLW}[width]
+                await test_util.send_instr(self.dut, test_util.encode(insn, a1 + j, tp, self.base_address + reg))
+
+            # Reading back registers also completes any outstanding stores
+            self.batch_pending_value = None
+            values = await test_util.read_reg4(self.dut, a1, True)
+            for j in range(len(group)):
+                self.known_regs[a1 + j] = values[j]
+            vals.extend(values[:len(group)])
+        await self._end_access()
+        return vals
+
+    # Within this context, writes with sync set are not individually read
+    # back.  Instead the values written are collected in a1-a4 and checked
+    # with a single multi-register store when 4 writes are pending, before the
+    # next read, and when the context ends.  The CPU executes the stores in
+    # order, so the read back still guarantees all earlier writes completed.
+    # Writes are still complete before any read returns, but note a write may
+    # not have taken effect when the write function returns.
+    @asynccontextmanager
+    async def deferred_sync(self):
+        prev_defer_sync = self.defer_sync
+        self.defer_sync = True
+        try:
+            yield self
+        finally:
+            self.defer_sync = prev_defer_sync
+        await self.sync()
+
+    # Change the access mode, see __init__.  For example, a test can make a
+    # few accesses through the CPU and then run its bulk test vectors with
+    # backdoor access:
+    #   await tqv.set_access(bulk_access(dut))
+    async def set_access(self, access):
+        assert not self.in_batch, "The access mode can't be changed in a batch"
+        await self.sync()
+        self._set_access(access)
+
+    # Forget the known contents of the CPU registers
+    def forget_regs(self):
+        self.known_regs = {}
+
+    # Check all deferred writes have completed
+    async def sync(self):
+        if len(self.pending_sync) != 0:
+            await self._begin_access()
+            await self._check_pending_sync()
+            await self._end_access()
+
+    # Whether the peripheral's interrupt line into TinyQV is high.  The line is
+    # read on its own, as other peripherals' interrupts may be X or Z.
+    def _interrupt_line_high(self):
+        # user_interrupts starts at bit 2
+        interrupts = self.dut.user_project.i_peripherals.user_interrupts
+        return interrupts.value.binstr[-(self.peripheral_num - 1)] == '1'
+
+    def _set_access(self, access):
+        assert access in ("frontdoor", "backdoor"), f"Unknown access mode {access}"
+        if access == "backdoor":
+            assert hasattr(self.dut.user_project, "i_peripherals"), "Backdoor access requires RTL simulation"
+            assert backdoor_supported(self.dut), "Backdoor access is not supported with Verilator, which can't force signals"
+        self.backdoor = access == "backdoor"
+
+    async def _write(self, reg, value, width, sync):
+        if self.backdoor:
+            await self._backdoor_write(reg, value, width)
+            return
+
+        await self._begin_access()
+        value &= 0xffffffff
+        if self.defer_sync and not self.in_batch:
+            # The value must be in its slot for the deferred check
+            src = await self._send_write(reg, value, width, a1 + len(self.pending_sync), False)
+        else:
+            await self._check_pending_sync()
+            src = await self._send_write(reg, value, width)
+        await self._end_write(src, value, sync)
+
+    async def _read(self, reg, width):
+        if self.backdoor:
+            return await self._backdoor_read(reg, width)
+
+        await self._begin_access()
+        await self._check_pending_sync()
+        insn = {8: InstructionLBU, 16: InstructionLHU, 32: InstructionLW}[width]
+        await test_util.send_instr(self.dut, test_util.encode(insn, a1, tp, self.base_address + reg))
+        val = await self._read_back(a1, True)
+        await self._end_access()
+        return val
+
+    async def _begin_access(self):
+        if not self.in_batch:
+            await self.idle.stop()
+
+    async def _end_access(self):
+        if not self.in_batch:
+            await self.idle.start()
+
+    async def _end_write(self, src, value, sync):
+        if self.in_batch:
+            # The batch checks the last write when it ends
+            self.batch_pending_value = (src, value)
+            return
+
+        if sync and self.defer_sync:
+            self.pending_sync.append(value)
+            if len(self.pending_sync) == 4:
+                await self._check_pending_sync()
+        elif sync:
+            # Read a register in order to ensure the store is complete before returning
+            assert await self._read_back(src) == value
+
+        await self.idle.start()
+
+    # Check the values of deferred writes by storing a1-a4 in one burst
+    async def _check_pending_sync(self):
+        if len(self.pending_sync) != 0:
+            values = await test_util.read_reg4(self.dut, a1)
+            for i in range(len(self.pending_sync)):
+                assert values[i] == self.pending_sync[i] & 0xffffffff
+            self.pending_sync = []
+
+    # Read the value of a CPU register, which is assumed to have just been loaded
+    async def _read_back(self, rd, allow_long_delay=False):
+        # Reading back a register also completes any outstanding stores
+        self.batch_pending_value = None
+        val = await test_util.read_reg(self.dut, rd, allow_long_delay)
+        if rd != x0:
+            self.known_regs[rd] = val
+        return val
+
+    # Send the instructions to store value to the register, loading it into rd
+    # first unless rd already holds it.  If allow_x0 is set a value of zero is
+    # stored from x0.  Returns the CPU register that was stored.
+    async def _send_write(self, reg, value, width, rd=a1, allow_x0=True):
+        if value == 0 and allow_x0:
+            src = x0
+        else:
+            src = rd
+            await self._load_value(rd, value)
+
+        store = {8: InstructionSB, 16: InstructionSH, 32: InstructionSW}[width]
+        await test_util.send_instr(self.dut, test_util.encode(store, tp, src, self.base_address + reg))
+        return src
+
+    # Load value into rd using the shortest instruction sequence
+    async def _load_value(self, rd, value):
+        known = self.known_regs.get(rd)
+        if known == value:
+            return
+
+        self.known_regs[rd] = value
+        if value < 0x800 or value >= 0xfffff800:
+            # Fits in a 12-bit signed immediate
+            await test_util.send_instr(self.dut, test_util.encode(InstructionADDI, rd, x0, to_imm12(value)))
+            return
+
+        if known is not None:
+            delta = (value - known) & 0xffffffff
+            if delta < 0x800 or delta >= 0xfffff800:
+                # Only a small change from the current value
+                await test_util.send_instr(self.dut, test_util.encode(InstructionADDI, rd, rd, to_imm12(delta)))
+                return
+
+        # Prepare value for LUI + ADDI
+        value_upper = ((value + 0x800) >> 12) & 0xfffff
+        value_lower = to_imm12(value & 0xfff)
+
+        await test_util.send_instr(self.dut, test_util.encode(InstructionLUI, rd, value_upper))
+        if value_lower != 0:
+            await test_util.send_instr(self.dut, test_util.encode(InstructionADDI, rd, rd, value_lower))
+
+    # Backdoor access drives the register interface of the peripherals block
+    # directly, bypassing the CPU.  The CPU is left executing NOPs, so it
+    # doesn't use the bus while it is forced.
+    async def _backdoor_write(self, reg, value, width):
+        peri = self.dut.user_project.i_peripherals
+        await FallingEdge(self.dut.clk)
+        peri.addr_in.value = Force((self.base_address + reg) & 0x7ff)
+        peri.data_in.value = Force(value & 0xffffffff)
+        peri.data_read_n.value = Force(0b11)
+        peri.data_write_n.value = Force(BUS_WIDTH_N[width])
+        await FallingEdge(self.dut.clk)
+        self._backdoor_release()
+
+    async def _backdoor_read(self, reg, width):
+        peri = self.dut.user_project.i_peripherals
+        await FallingEdge(self.dut.clk)
+        peri.addr_in.value = Force((self.base_address + reg) & 0x7ff)
+        peri.data_write_n.value = Force(0b11)
+        peri.data_read_n.value = Force(BUS_WIDTH_N[width])
+        peri.data_read_complete.value = Force(0)
+        for _ in range(BACKDOOR_READ_TIMEOUT):
+            await FallingEdge(self.dut.clk)
+            if peri.data_ready.value == 1:
+                break
+        else:
+            assert False, "Timed out waiting for backdoor read"
+
+        val = peri.data_out.value.integer & ((1 << width) - 1)
+
+        # Complete the read so that the peripherals block releases the data
+        peri.data_read_n.value = Force(0b11)
+        peri.data_read_complete.value = Force(1)
+        await FallingEdge(self.dut.clk)
+        self._backdoor_release()
+        return val
+
+    def _backdoor_release(self):
+        peri = self.dut.user_project.i_peripherals
+        for signal in (peri.addr_in, peri.data_in, peri.data_write_n, peri.data_read_n, peri.data_read_complete):
+            signal.value = Release()
+
+if harness_profile.enabled:
+    harness_profile.profile_class(TinyQV)
@@ -0,0 +1,7 @@
+# Unit tests of the Python tools in test/, which don't need a simulator.
+# Run with "make unit" in test/.
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,26 @@
+from affected_tests import affected_tests, makefile_tests
+
+def all_tests():
+    tests = makefile_tests()
+    return [test for num in sorted(tests) for test in tests[num]]
+
+def test_peripheral_source():
+    assert affected_tests(["src/user_peripherals/wdt/tqvp_nkanderson_wdt.sv"]) == ["wdt.test", "wdt.test_harness"]
+    assert affected_tests(["src/user_peripherals/crc32.v"]) == ["crc32"]
+
+# The UART's number is given by a localparam, and it is built from several files
+def test_peripheral_submodule():
+    assert affected_tests(["src/user_peripherals/uart/uart_tx.v"]) == ["uart"]
+
+def test_peripheral_test():
+    assert affected_tests(["test/user_peripherals/wdt/test.py"]) == ["wdt.test", "wdt.test_harness"]
+    assert affected_tests(["test/user_peripherals/uart.py"]) == ["uart"]
+
+def test_shared_files():
+    assert affected_tests(["src/peripherals.v"]) == all_tests()
+    assert affected_tests(["test/tqv.py"]) == all_tests()
+    assert affected_tests(["test/user_peripherals/__init__.py"]) == all_tests()
+
+def test_unrelated_files():
+    assert affected_tests([]) == []
+    assert affected_tests(["test/test_prime.py", "docs/info.md"]) == []
@@ -0,0 +1,49 @@
+import os
+import struct
+import subprocess
+import sys
+
+import pytest
+
+import elf
+from qspi_model import Memory
+
+TEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SYMBOLS_ELF = os.path.join(TEST_DIR, "symbols.elf")
+
+def test_segments():
+    prog = elf.Elf(SYMBOLS_ELF)
+    assert prog.entry == 0
+    assert [(addr, len(data)) for addr, data in prog.segments] == [(0, 0x2c)]
+
+def test_symbols():
+    symbols = elf.Elf(SYMBOLS_ELF).symbols
+    assert symbols["main"] == elf.Symbol(0x4, 0x24, True)
+    assert symbols["magic"] == elf.Symbol(0x28, 4, False)
+    assert symbols["counter"] == elf.Symbol(elf.RAM_A_ADDR, 4, False)
+    assert symbols["copy"] == elf.Symbol(elf.RAM_A_ADDR + 4, 4, False)
+
+def test_flash_image():
+    prog = elf.Elf(SYMBOLS_ELF)
+    image = prog.flash_image()
+    magic = prog.symbols["magic"].address
+    assert struct.unpack_from("<I", image, magic)[0] == 0x12345678
+
+    # A segment after the start of RAM A can't be put in the flash
+    prog.segments.append((elf.RAM_A_ADDR, b"\x01"))
+    with pytest.raises(ValueError, match="not in the flash"):
+        prog.flash_image()
+
+def test_hex(tmp_path):
+    hex_path = tmp_path / "symbols.hex"
+    subprocess.run([sys.executable, os.path.join(TEST_DIR, "elf.py"), "hex", SYMBOLS_ELF, str(hex_path)], check=True)
+    image = elf.Elf(SYMBOLS_ELF).flash_image()
+    memory = Memory("flash", 64)
+    memory.load(str(hex_path))
+    assert memory.data[:len(image)] == image
+
+def test_not_elf(tmp_path):
+    path = tmp_path / "prog.elf"
+    path.write_bytes(b"\x7fELF\x02\x01" + bytes(58))
+    with pytest.raises(ValueError, match="not a 32-bit little endian ELF file"):
+        elf.Elf(str(path))
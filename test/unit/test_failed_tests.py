@@ -0,0 +1,27 @@
+import failed_tests
+
+RESULTS = """<testsuites>
+  <testsuite name="all">
+    <properties><property name="random_seed" value="1234"/></properties>
+    <testcase name="test_pass" sim_time_ns="500000"/>
+    <testcase name="test_fail" sim_time_ns="250000"><failure message="assert"/></testcase>
+    <testcase name="test_error" sim_time_ns="50000"><error message="exception"/></testcase>
+  </testsuite>
+</testsuites>
+"""
+
+def test_lists_failures_and_errors(tmp_path, capsys):
+    path = tmp_path / "results.xml"
+    path.write_text(RESULTS)
+    failed_tests.main(str(path), 100)
+    assert capsys.readouterr().out.splitlines() == ["test_fail 150000 1234", "test_error 0 1234"]
+
+def test_no_seed(tmp_path, capsys):
+    path = tmp_path / "results.xml"
+    path.write_text(RESULTS.replace("random_seed", "other"))
+    failed_tests.main(str(path), 100)
+    assert capsys.readouterr().out.splitlines() == ["test_fail 150000", "test_error 0"]
+
+def test_missing_results(tmp_path, capsys):
+    failed_tests.main(str(tmp_path / "results.xml"), 100)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,56 @@
+import merge_results
+
+RESULTS = """<testsuites name="results">
+  <testsuite name="all" package="all">
+    <properties><property name="random_seed" value="123"/></properties>
+    <testcase name="test_a" classname="user_peripherals.uart" time="1.5" sim_time_ns="1000"/>
+    <testcase name="test_b" classname="user_peripherals.uart" time="2.0" sim_time_ns="3000">
+      <failure message="assert"/>
+    </testcase>
+    <testcase name="test_c" classname="user_peripherals.uart" time="0.5" sim_time_ns="0">
+      <skipped/>
+    </testcase>
+  </testsuite>
+</testsuites>
+"""
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+def test_suite_name():
+    assert merge_results.suite_name("sim_build/peri-uart.xml") == "uart"
+    assert merge_results.suite_name("peri-wdt.test.xml") == "wdt.test"
+    assert merge_results.suite_name("basic-results.xml") == "basic"
+
+def test_merge(tmp_path):
+    root = merge_results.merge([write(tmp_path / "peri-uart.xml", RESULTS)])
+    suite = root.find("testsuite")
+    assert suite.get("name") == "uart"
+    assert [tc.get("name") for tc in suite.findall("testcase")] == ["test_a", "test_b", "test_c"]
+    assert suite.find("properties/property").get("value") == "123"
+    for element in (suite, root):
+        assert (element.get("tests"), element.get("failures"), element.get("skipped")) == ("3", "1", "1")
+        assert (element.get("time"), element.get("sim_time_ns")) == ("4.000", "4000.000")
+
+# A missing, invalid or empty results file means the simulation crashed
+def test_crashed(tmp_path):
+    paths = [str(tmp_path / "peri-missing.xml"),
+             write(tmp_path / "peri-invalid.xml", "<testsuites><testsuite>"),
+             write(tmp_path / "peri-empty.xml", "<testsuites><testsuite name='all'/></testsuites>"),
+             write(tmp_path / "peri-uart.xml", RESULTS)]
+    root = merge_results.merge(paths)
+    suites = root.findall("testsuite")
+    assert [suite.get("name") for suite in suites] == ["missing", "invalid", "empty", "uart"]
+    for suite in suites[:3]:
+        assert (suite.get("tests"), suite.get("failures")) == ("1", "1")
+        assert suite.find("testcase").get("name") == "crashed"
+    assert (root.get("tests"), root.get("failures")) == ("6", "4")
+
+def test_print_slowest(tmp_path, capsys):
+    root = merge_results.merge([write(tmp_path / "peri-uart.xml", RESULTS)])
+    merge_results.print_slowest(root, 2)
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0] == "Slowest tests, of 3 taking 4.0s:"
+    assert lines[2].endswith("uart.test_b") and lines[3].endswith("uart.test_a")
+    assert len(lines) == 4
@@ -0,0 +1,72 @@
+import os
+
+import pytest
+
+import elf
+import qspi_model
+from qspi_model import Memory, QspiModel
+
+TEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_load_hex(tmp_path):
+    path = tmp_path / "prog.hex"
+    path.write_text("01 2 // comment @10\n03\n@10 aa bb\n@8 cc // @20\n")
+    memory = Memory("flash", 32)
+    memory.load(str(path))
+    assert memory.data[:4] == b"\x01\x02\x03\x00"
+    assert memory.data[8:9] == b"\xcc"
+    assert memory.data[0x10:0x12] == b"\xaa\xbb"
+
+    # The @ addresses are relative to the offset
+    memory = Memory("flash", 32)
+    memory.load(str(path), 4)
+    assert memory.data[4:7] == b"\x01\x02\x03"
+    assert memory.data[0x14:0x16] == b"\xaa\xbb"
+
+def test_load_bin(tmp_path):
+    path = tmp_path / "prog.bin"
+    path.write_bytes(b"\x11\x22\x33")
+    memory = Memory("ram_a", 8, str(tmp_path))
+    memory.load(str(path), 5)
+    assert memory.data[:] == b"\x00" * 5 + b"\x11\x22\x33"
+    memory.dump(str(tmp_path / "dump.bin"))
+    assert (tmp_path / "dump.bin").read_bytes() == memory.data[:]
+
+def test_load_too_large(tmp_path):
+    hex_path = tmp_path / "prog.hex"
+    hex_path.write_text("01 02\n@f 03 04\n")
+    with pytest.raises(AssertionError, match="don't fit in the flash"):
+        Memory("flash", 16).load(str(hex_path))
+
+    bin_path = tmp_path / "prog.bin"
+    bin_path.write_bytes(bytes(9))
+    with pytest.raises(AssertionError, match="don't fit in the ram_b"):
+        Memory("ram_b", 8, str(tmp_path)).load(str(bin_path))
+    with pytest.raises(AssertionError):
+        Memory("ram_b", 16).load(str(bin_path), 8)
+
+def test_load_elf():
+    model = QspiModel(None, 64, 64)
+    model.load(os.path.join(TEST_DIR, "symbols.elf"))
+    image = elf.Elf(os.path.join(TEST_DIR, "symbols.elf")).flash_image()
+    assert model.flash.data[:len(image)] == image
+    assert model.ram_a.data == bytes(64)
+
+class FakeElf:
+    segments = []
+
+    def __init__(self, path):
+        pass
+
+def test_load_elf_segments(monkeypatch):
+    monkeypatch.setattr(elf, "Elf", FakeElf)
+    FakeElf.segments = [(0x10, b"\x01"), (elf.RAM_A_ADDR + 4, b"\x02\x03"), (elf.RAM_B_ADDR, b"\x04")]
+    model = QspiModel(None, 64, 64)
+    model.load("prog.elf")
+    assert model.flash.data[0x10] == 1
+    assert model.ram_a.data[4:6] == b"\x02\x03"
+    assert model.ram_b.data[0] == 4
+
+    FakeElf.segments = [(elf.RAM_A_ADDR + 60, bytes(8))]
+    with pytest.raises(AssertionError, match="don.t fit in the ram_a"):
+        model.load("prog.elf")
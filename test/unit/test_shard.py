@@ -0,0 +1,60 @@
+import argparse
+import json
+
+import pytest
+
+import shard
+
+JOBS = [f"core:test_{i}" for i in range(10)] + [f"peri:peri_{i}.test" for i in range(20)]
+TIMES = {job: float(i % 7 + 1) for i, job in enumerate(JOBS)}
+
+def test_every_job_in_one_shard():
+    for num_shards in (1, 3, 8):
+        shards = shard.assign_shards(JOBS, TIMES, num_shards)
+        assert len(shards) == num_shards
+        assert sorted(job for jobs in shards for job in jobs) == sorted(JOBS)
+
+# The split only depends on the jobs and times, not their order
+def test_stable():
+    shards = shard.assign_shards(JOBS, TIMES, 4)
+    assert shard.assign_shards(list(reversed(JOBS)), TIMES, 4) == shards
+    assert shard.assign_shards(JOBS, dict(reversed(TIMES.items())), 4) == shards
+
+def test_balanced():
+    times = {"a": 10, "b": 6, "c": 5, "d": 1}
+    assert shard.assign_shards(list(times), times, 2) == [["a", "d"], ["b", "c"]]
+
+    # A job without a time is taken to have the median time
+    assert shard.assign_shards(["a", "b", "new"], {"a": 4, "b": 2, "c": 1}, 2) == [["a"], ["b", "new"]]
+
+def test_job_seed():
+    assert shard.job_seed("abc123", "peri:uart") == shard.job_seed("abc123", "peri:uart")
+    assert shard.job_seed("abc123", "peri:uart") != shard.job_seed("abc123", "peri:spi")
+    assert shard.job_seed("abc123", "peri:uart") != shard.job_seed("def456", "peri:uart")
+
+def test_all_jobs():
+    jobs = shard.all_jobs()
+    assert "core:test_start" in jobs
+    assert "peri:wdt.test" in jobs and "peri:wdt.test_harness" in jobs
+    assert len(jobs) == len(set(jobs))
+
+def test_record(tmp_path, monkeypatch):
+    times_file = tmp_path / "test_times.json"
+    times_file.write_text(json.dumps({"core:test_old": 3.0, "peri:uart": 1.0}))
+    monkeypatch.setattr(shard, "TIMES_FILE", str(times_file))
+    results = tmp_path / "results.xml"
+    results.write_text("""<testsuites><testsuite>
+        <testcase classname="test" name="test_start" time="1.04"/>
+        <testcase classname="user_peripherals.uart" name="test_a" time="2.0"/>
+        <testcase classname="user_peripherals.uart" name="test_b" time="3.5"/>
+        <testcase classname="test_hello" name="test_hello" time="9.0"/>
+    </testsuite></testsuites>""")
+
+    shard.record([str(results)])
+    assert json.loads(times_file.read_text()) == {"core:test_old": 3.0, "core:test_start": 1.0, "peri:uart": 5.5}
+
+def test_parse_shard():
+    assert shard.parse_shard("2/4") == (2, 4)
+    for spec in ("0/4", "5/4", "2", "a/b"):
+        with pytest.raises(argparse.ArgumentTypeError):
+            shard.parse_shard(spec)
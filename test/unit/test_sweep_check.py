@@ -0,0 +1,23 @@
+import os
+
+import pytest
+
+import elf
+import sweep
+
+TEST_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_parse_prog():
+    assert sweep.parse_prog("ram_data=build/prog.elf") == ("ram_data", "build/prog.elf")
+    assert sweep.parse_prog("build/prog.elf") == ("prog", "build/prog.elf")
+
+def test_code_in_flash():
+    sweep.check_prog(os.path.join(TEST_DIR, "symbols.elf"))
+    sweep.check_prog("hello.hex")
+
+def test_code_in_ram(monkeypatch):
+    prog = elf.Elf(os.path.join(TEST_DIR, "symbols.elf"))
+    prog.symbols["main"] = elf.Symbol(elf.RAM_A_ADDR + 0x100, 4, True)
+    monkeypatch.setattr(elf, "Elf", lambda path: prog)
+    with pytest.raises(SystemExit, match="function main"):
+        sweep.check_prog("prog.elf")
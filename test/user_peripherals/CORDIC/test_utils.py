@@ -74,8 +74,7 @@ async def wait_done(dut,tqv, busy_val = 1, done_val = 2,
     raise TimeoutError(f"Timeout waiting for DONE status (status={status}).")
 
 async def read_out_pair_signed(dut, tqv, width=16):
-    out1 = await tqv.read_hword_reg(4)
-    out2 = await tqv.read_hword_reg(5)
+    out1, out2 = await tqv.read_regs([(4, 16), (5, 16)])
     
     out1 = out1 & 0b111111111111111111
     out2 = out2 & 0b111111111111111111
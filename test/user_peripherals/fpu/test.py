@@ -17,13 +17,12 @@ def f16_hex_to_float(h16):
     """Convert 16-bit half-precision float stored in a 32-bit word to Python float."""
     return float(np.frombuffer(struct.pack('<H', h16 & 0xFFFF), dtype=np.float16)[0])
 
-async def wait_until_not_busy(tqv, timeout=100):
-    for _ in range(timeout):
-        busy = await tqv.read_byte_reg(0x10)
-        if busy == 0:
-            return
-        await ClockCycles(tqv.dut.clk, 1)
-    raise TimeoutError("FPU remained busy after timeout")
+# Clocks to wait for the FPU to finish.  This allows as long as 100 reads of
+# the busy register, as each byte read through the CPU takes about 100 clocks.
+BUSY_TIMEOUT_CYCLES = 100 * 100
+
+async def wait_until_not_busy(tqv, timeout=BUSY_TIMEOUT_CYCLES):
+    await tqv.poll(0x10, 0xff, 0, timeout)
 
 @cocotb.test()
 async def test_fpu_add(dut):
@@ -201,31 +201,33 @@ class Device:
         # We did not check if the program is currently running, 
         # writing while program is running may have undefined behaviour
 
-        await self.write32_reg_0()
-        await self.write32_reg_1()
-        await self.write32_reg_2()
-        await self.write32_reg_3()
-        await self.write32_reg_4()
-
-        word = 0
-        count = 0
-        i = 0
+        # The register writes are checked together when the program is complete
+        async with self.tqv.deferred_sync():
+            await self.write32_reg_0()
+            await self.write32_reg_1()
+            await self.write32_reg_2()
+            await self.write32_reg_3()
+            await self.write32_reg_4()
+
+            word = 0
+            count = 0
+            i = 0
         
-        for symbol_duration_selector, symbol_transmit_level in program:
-            symbol_data = (symbol_transmit_level << 1 ) | symbol_duration_selector
+            for symbol_duration_selector, symbol_transmit_level in program:
+                symbol_data = (symbol_transmit_level << 1 ) | symbol_duration_selector
 
-            word |= symbol_data << (i * 2)
-            i += 1
+                word |= symbol_data << (i * 2)
+                i += 1
 
-            if i == 16:
-                await self.tqv.write_word_reg(0b100000 | count, word)
-                word = 0
-                i = 0
-                count += 4
+                if i == 16:
+                    await self.tqv.write_word_reg(0b100000 | count, word)
+                    word = 0
+                    i = 0
+                    count += 4
 
-        # Write the remaining bits
-        if i > 0:
-            await self.tqv.write_word_reg(0b100000 | count, word)
+            # Write the remaining bits
+            if i > 0:
+                await self.tqv.write_word_reg(0b100000 | count, word)
 
  
     async def write_program_1bpe(self, program: list[int]):
@@ -234,29 +236,31 @@ class Device:
         # We did not check if the program is currently running, 
         # writing while program is running may have undefined behaviour
 
-        await self.write32_reg_0()
-        await self.write32_reg_1()
-        await self.write32_reg_2()
-        await self.write32_reg_3()
-        await self.write32_reg_4()
-
-        word = 0
-        count = 0
-        i = 0
+        # The register writes are checked together when the program is complete
+        async with self.tqv.deferred_sync():
+            await self.write32_reg_0()
+            await self.write32_reg_1()
+            await self.write32_reg_2()
+            await self.write32_reg_3()
+            await self.write32_reg_4()
+
+            word = 0
+            count = 0
+            i = 0
         
-        for single_bit_value in program:
-            word |= single_bit_value << i 
-            i += 1
-
-            if i == 32:
+            for single_bit_value in program:
+                word |= single_bit_value << i 
+                i += 1
+
+                if i == 32:
+                    await self.tqv.write_word_reg(0b100000 | count, word)
+                    word = 0
+                    i = 0
+                    count += 4
+
+            # Write the remaining bits
+            if i > 0:
                 await self.tqv.write_word_reg(0b100000 | count, word)
-                word = 0
-                i = 0
-                count += 4
-
-        # Write the remaining bits
-        if i > 0:
-            await self.tqv.write_word_reg(0b100000 | count, word)
     
     def _get_expected_from_symbol(self, symbol: int, use_auxillary: bool) -> dict:
         """
@@ -46,22 +46,24 @@ async def test_project(dut):
     dut._log.info("Test project behavior")
 
     # clear console (all spaces)
-    for i in range(30):
-        await tqv.write_word_reg(i, 32)
-
-    await tqv.write_byte_reg(0x30, 0b010000)  # backgrond color = dark blue
-    await tqv.write_byte_reg(0x31, 0b001100)  # text color 1 = green
-    await tqv.write_byte_reg(0x32, 0b110011)  # text color 2 = magenta
-
-    # write text using color 1
-    for (i, ch) in enumerate("VGA"):
-        await tqv.write_byte_reg(0+i, ord(ch))
-    # write text using color 2
-    for (i, ch) in enumerate("CONSOLE"):
-        await tqv.write_byte_reg(10+i, 0x80 | ord(ch))
-    # write text alternating colors
-    for (i, ch) in enumerate("PERIPHERAL"):
-        await tqv.write_byte_reg(20+i, ((i & 1) << 7) | ord(ch))
+    await tqv.write_regs([(i, 32, 32) for i in range(30)])
+
+    await tqv.write_regs([
+        (0x30, 0b010000),  # backgrond color = dark blue
+        (0x31, 0b001100),  # text color 1 = green
+        (0x32, 0b110011),  # text color 2 = magenta
+    ])
+
+    async with tqv.batch():
+        # write text using color 1
+        for (i, ch) in enumerate("VGA"):
+            await tqv.write_byte_reg(0+i, ord(ch))
+        # write text using color 2
+        for (i, ch) in enumerate("CONSOLE"):
+            await tqv.write_byte_reg(10+i, 0x80 | ord(ch))
+        # write text alternating colors
+        for (i, ch) in enumerate("PERIPHERAL"):
+            await tqv.write_byte_reg(20+i, ((i & 1) << 7) | ord(ch))
 
     # # grab next VGA frame and compare with reference image
     # vgaframe = await grab_vga(dut, hsync, vsync, R1, R0, B1, B0, G1, G0)
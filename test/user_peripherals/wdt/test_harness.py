@@ -0,0 +1,187 @@
+# SPDX-FileCopyrightText: © 2025 Tiny Tapeout
+# SPDX-License-Identifier: Apache-2.0
+
+# Focused tests of the TinyQV register access helpers in tqv.py.  They use the
+# watchdog because it has a 32-bit read/write register, a register that only
+# takes effect depending on an earlier write, a status register and an
+# interrupt.  The accesses are made through the CPU, which is what is tested.
+
+from contextlib import contextmanager
+
+import cocotb
+from cocotb.clock import Clock
+
+from riscvmodel.insn import *
+from riscvmodel.regnames import x0, a1, a2
+
+import test_util
+from tqv import TinyQV
+
+from user_peripherals.wdt.test import PERIPHERAL_NUM, CLK_PERIOD_NS, LARGE_COUNTDOWN, WDT_ADDR, decode_wdt_status
+
+async def start_tqv(dut):
+    clock = Clock(dut.clk, CLK_PERIOD_NS, units="ns")
+    cocotb.start_soon(clock.start())
+    tqv = TinyQV(dut, PERIPHERAL_NUM, "frontdoor")
+    await tqv.reset()
+    return tqv
+
+# Collect the instructions sent with test_util.send_instr within the context
+@contextmanager
+def recorded_instrs():
+    instrs = []
+    send_instr = test_util.send_instr
+    async def record(dut, data, *args, **kwargs):
+        instrs.append(data)
+        await send_instr(dut, data, *args, **kwargs)
+
+    test_util.send_instr = record
+    try:
+        yield instrs
+    finally:
+        test_util.send_instr = send_instr
+
+# The stores in a batch are issued in order: start only has an effect once
+# the countdown has been written, and the last write to a register wins.
+@cocotb.test()
+async def test_batch_order(dut):
+    tqv = await start_tqv(dut)
+
+    async with tqv.batch():
+        await tqv.write_word_reg(WDT_ADDR["countdown"], 0x100)
+        await tqv.write_word_reg(WDT_ADDR["countdown"], 0x200)
+        await tqv.write_word_reg(WDT_ADDR["countdown"], LARGE_COUNTDOWN)
+        await tqv.write_word_reg(WDT_ADDR["start"], 1)
+    assert tqv.batch_pending_value is None
+
+    status = decode_wdt_status(await tqv.read_word_reg(WDT_ADDR["status"]))
+    assert status["started"] and status["counter_active"]
+    assert await tqv.read_word_reg(WDT_ADDR["countdown"]) == LARGE_COUNTDOWN
+
+    await tqv.write_regs([(WDT_ADDR["enable"], 0, 32), (WDT_ADDR["countdown"], 0x345, 32)])
+    assert await tqv.read_word_reg(WDT_ADDR["countdown"]) == 0x345
+
+# Deferred writes are checked four at a time, and before a read, so the read
+# sees the last value written.
+@cocotb.test()
+async def test_deferred_sync_order(dut):
+    tqv = await start_tqv(dut)
+
+    async with tqv.deferred_sync():
+        for value in range(0x101, 0x107):
+            await tqv.write_word_reg(WDT_ADDR["countdown"], value)
+        assert len(tqv.pending_sync) == 2
+        assert await tqv.read_word_reg(WDT_ADDR["countdown"]) == 0x106
+        assert len(tqv.pending_sync) == 0
+
+        await tqv.write_word_reg(WDT_ADDR["countdown"], 0x12345)
+        assert len(tqv.pending_sync) == 1
+    assert len(tqv.pending_sync) == 0
+    assert await tqv.read_word_reg(WDT_ADDR["countdown"]) == 0x12345
+
+# Values are loaded with the shortest sequence: a single ADDI if the value
+# fits in 12 bits or is close to the known contents of the register, a LUI if
+# its bottom 12 bits are zero, otherwise LUI and ADDI, where the LUI is rounded
+# up when the bottom 12 bits are negative as a signed immediate.
+@cocotb.test()
+async def test_load_value(dut):
+    tqv = await start_tqv(dut)
+
+    loads = [
+        (0x123,      [(InstructionADDI, a1, x0, 0x123)]),
+        (0xfffff800, [(InstructionADDI, a1, x0, -0x800)]),
+        (0x12345000, [(InstructionLUI, a1, 0x12345)]),
+        (0x12345010, [(InstructionADDI, a1, a1, 0x10)]),
+        (0x12345010, []),
+        (0x12345fff, [(InstructionLUI, a1, 0x12346), (InstructionADDI, a1, a1, -1)]),
+        (0x7ffff800, [(InstructionLUI, a1, 0x80000), (InstructionADDI, a1, a1, -0x800)]),
+        (0x800,      [(InstructionLUI, a1, 0x1), (InstructionADDI, a1, a1, -0x800)]),
+        (0xfffff7ff, [(InstructionLUI, a1, 0xfffff), (InstructionADDI, a1, a1, 0x7ff)]),
+    ]
+
+    await tqv.idle.stop()
+    for value, expected in loads:
+        with recorded_instrs() as instrs:
+            await tqv._load_value(a1, value)
+        assert instrs == [test_util.encode(*instr) for instr in expected], f"Loading {value:08x}"
+        assert await test_util.read_reg(dut, a1) == value
+        assert tqv.known_regs[a1] == value
+    await tqv.idle.start()
+
+# read_regs records the values it loads into a1-a4, so writing a value just
+# read needs no load.  Instructions sent directly with test_util change the
+# registers without the harness knowing, which forget_regs allows for.
+@cocotb.test()
+async def test_known_regs(dut):
+    tqv = await start_tqv(dut)
+
+    await tqv.write_word_reg(WDT_ADDR["countdown"], LARGE_COUNTDOWN)
+    countdown, status = await tqv.read_regs([(WDT_ADDR["countdown"], 32), (WDT_ADDR["status"], 32)])
+    assert countdown == LARGE_COUNTDOWN
+    assert tqv.known_regs[a1] == countdown and tqv.known_regs[a2] == status
+
+    # Only the store and the read back are sent
+    with recorded_instrs() as instrs:
+        await tqv.write_word_reg(WDT_ADDR["countdown"], LARGE_COUNTDOWN)
+    assert len(instrs) == 2
+
+    await tqv.idle.stop()
+    await test_util.send_instr(dut, test_util.encode(InstructionADDI, a1, x0, 0x55))
+    await tqv.idle.start()
+    tqv.forget_regs()
+    assert tqv.known_regs == {}
+
+    # The value must be loaded again, with LUI and ADDI
+    with recorded_instrs() as instrs:
+        await tqv.write_word_reg(WDT_ADDR["countdown"], LARGE_COUNTDOWN)
+    assert len(instrs) == 4
+    assert await tqv.read_word_reg(WDT_ADDR["countdown"]) == LARGE_COUNTDOWN
+
+# wait_interrupt finds the peripheral's interrupt in user_interrupts, which
+# starts at bit 2.  Check it against the watchdog's own interrupt output.
+@cocotb.test()
+async def test_wait_interrupt(dut):
+    tqv = await start_tqv(dut)
+    wdt_interrupt = dut.user_project.i_peripherals.i_user_peri06.user_interrupt
+
+    # The watchdog hasn't been started
+    try:
+        await tqv.wait_interrupt(200)
+    except AssertionError as e:
+        assert "Timed out" in str(e)
+    else:
+        assert False, "wait_interrupt returned without an interrupt"
+    assert wdt_interrupt.value == 0
+
+    async with tqv.batch():
+        await tqv.write_word_reg(WDT_ADDR["countdown"], 300)
+        await tqv.write_word_reg(WDT_ADDR["start"], 1)
+    assert wdt_interrupt.value == 0
+    await tqv.wait_interrupt(1000)
+    assert wdt_interrupt.value == 1
+
+# poll loops on the CPU until the masked register matches, or fails after
+# timeout_cycles.  The timed out loop is still running, so the design is
+# reset before continuing.
+@cocotb.test()
+async def test_poll(dut):
+    tqv = await start_tqv(dut)
+
+    # The watchdog hasn't been started, so timeout_pending never sets
+    try:
+        await tqv.poll(WDT_ADDR["status"], 0x4, 0x4, timeout_cycles=500, width=32)
+    except AssertionError as e:
+        assert "Timed out polling" in str(e)
+    else:
+        assert False, "poll returned without a match"
+    await tqv.reset()
+
+    async with tqv.batch():
+        await tqv.write_word_reg(WDT_ADDR["countdown"], 1000)
+        await tqv.write_word_reg(WDT_ADDR["start"], 1)
+    cycles = await tqv.poll(WDT_ADDR["status"], 0x4, 0x4, timeout_cycles=2000, width=32)
+    assert 300 < cycles < 1100
+    assert decode_wdt_status(await tqv.read_word_reg(WDT_ADDR["status"]))["timeout_pending"]
+
+    # A register that already matches returns on the first read
+    assert await tqv.poll(WDT_ADDR["countdown"], 0xff, 1000 & 0xff) < 200
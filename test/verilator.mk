@@ -0,0 +1,20 @@
+# Settings for SIM=verilator, included by test_basic.mk and test_prog.mk once
+# they have set SIM_BUILD and TOPLEVEL.
+#
+# Verilator can only be used for RTL simulation.  It is stricter than Icarus,
+# so its warnings are not fatal.  Waves are written to DUMP_FILE.
+# Tracing is always compiled in for a cached build, so it can be shared by
+# runs with and without waves.
+ifeq ($(SIM),verilator)
+ifneq ($(filter yes,$(GATES) $(SYNTH)),)
+$(error Verilator can only be used for RTL simulation)
+endif
+COMPILE_ARGS += -Wno-fatal -Wno-lint -Wno-style
+ifneq ($(filter 1,$(WAVES) $(SIM_CACHE)),)
+COMPILE_ARGS += --trace-fst --trace-structs
+endif
+ifeq ($(WAVES),1)
+DUMP_FILE ?= $(SIM_BUILD)/$(TOPLEVEL).fst
+SIM_ARGS += --trace --trace-file $(DUMP_FILE)
+endif
+endif